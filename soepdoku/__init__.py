@@ -1,12 +1,18 @@
 from .reader import read_csv, read_csv_cli
-from .writer import write_csv
+from .writer import write_csv, write_many
 from .translator import Translator
+from .memory import TranslationMemory
+from .backends import TranslationBackend, FuzzyMemoryBackend
 from .utils import get_missings
 
 __all__ = [
     "read_csv",
     "read_csv_cli",
     "write_csv",
+    "write_many",
     "Translator",
+    "TranslationMemory",
+    "TranslationBackend",
+    "FuzzyMemoryBackend",
     "get_missings",
 ]
@@ -0,0 +1,106 @@
+from abc import ABC, abstractmethod
+
+
+class TranslationBackend(ABC):
+    """Interface of translation services used by Translator. A backend translates a list
+    of texts; backends that support glossaries additionally implement create_glossary()
+    and list_glossaries() as in deepl.Translator.
+    """
+
+    @abstractmethod
+    def translate_text(self, text, source_lang=None, target_lang=None, glossary=None, **kwargs):
+        """Translates texts.
+
+        Args:
+            text (list of str): Texts to be translated.
+            source_lang (str, optional): Source language. Defaults to None.
+            target_lang (str, optional): Target language. Defaults to None.
+            glossary (optional): Glossary of the backend. Defaults to None.
+
+        Returns:
+            list: Translation of each text, or None if a text cannot be translated.
+        """
+
+
+def _same_language(lang1, lang2):
+    """Compares language codes without regional variant, ex.: 'en' and 'EN-US'."""
+    return str(lang1).upper().split('-')[0]==str(lang2).upper().split('-')[0]
+
+
+class FuzzyMemoryBackend(TranslationBackend):
+    """Offline backend that answers from existing translations of SOEP-style metadata.
+    A text is translated with the translation of the identical text or, if there is none,
+    of the most similar text within a maximum normalized Levenshtein distance. Similar
+    texts are searched with an n-gram index. Requires the package 'Levenshtein' for
+    near matches.
+
+    Example:
+        backend = FuzzyMemoryBackend(["v39/variables.csv", "v39/variable_categories.csv"])
+        translator = soep.Translator(service=backend)
+    """
+
+    def __init__(
+            self,
+            data,
+            source_target=None,
+            source_lang='DE',
+            target_lang='EN-US',
+            threshold=0.1,
+            candidates=20,
+        ):
+        """Builds the translation memory.
+
+        Args:
+            data (DataFrame, Path, str, or list): Bilingual metadata or CSV files.
+            source_target (dict, optional): Dictionary of source and target columns.
+                Defaults to {'label_de': 'label', 'text_de': 'text', 'instruction_de': 'instruction'}.
+            source_lang (str, optional): Language of source columns. Defaults to 'DE'.
+            target_lang (str, optional): Language of target columns. Defaults to 'EN-US'.
+            threshold (float, optional): Maximum normalized Levenshtein distance of near
+                matches. If 0, only identical texts are translated. Defaults to 0.1.
+            candidates (int, optional): Number of candidates per text that are scored.
+                Defaults to 20.
+        """
+        from .memory import bilingual_pairs
+        from .similarity import NGramIndex
+
+        self.translations = bilingual_pairs(data, source_target)
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.threshold = threshold
+        self.candidates = candidates
+        self.sources = list(self.translations.keys())
+        self.index = NGramIndex(self.sources)
+
+    def __len__(self):
+        return len(self.translations)
+
+    def translate_text(self, text, source_lang=None, target_lang=None, glossary=None, **kwargs):
+        from .similarity import best_matches
+
+        for lang, own in [(source_lang, self.source_lang), (target_lang, self.target_lang)]:
+            if (lang is not None) and not _same_language(lang, own):
+                raise ValueError(
+                    f"Translation memory contains {self.source_lang} -> {self.target_lang}, "
+                    f"not {source_lang} -> {target_lang}."
+                )
+
+        single = isinstance(text, str)
+        texts = [text] if single else list(text)
+        results = [self.translations.get(t) for t in texts]
+
+        # Near matches
+        missing = [k for k, result in enumerate(results) if result is None]
+        if (len(missing) > 0) & (self.threshold > 0) & (len(self.sources) > 0):
+            matches = best_matches(
+                self.index,
+                [texts[k] for k in missing],
+                top_k=1,
+                threshold=self.threshold,
+                candidates=self.candidates,
+            )
+            for k, match in zip(missing, matches):
+                if len(match) > 0:
+                    results[k] = self.translations[self.sources[match[0][0]]]
+
+        return results[0] if single else results
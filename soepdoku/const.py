@@ -118,6 +118,40 @@ GENERATIONS_KEYS_OUT = ['output_dataset', 'output_variable']
 # Warning: .merge.merge_quest_log_gen() merges LOGICALS_KEYS_OUT[0] to GENERATIONS_KEYS_IN[0]
 # and so forth. Do not change the order of keys or modify merge_quest_log_gen().
 
+# Rows of tables/CSV files are identified by the following columns.
+CSV_TYPE_TO_KEYS = {
+    "questions": QUESTIONS_KEYS,
+    "answers": ['study', 'questionnaire', 'answer_list', 'value'],
+    "variables": ['study', 'dataset', 'version', 'variable'],
+    "variable_categories": ['study', 'dataset', 'version', 'variable', 'value'],
+    "logical_variables": LOGICALS_KEYS_IN + LOGICALS_KEYS_OUT,
+    "generations": [
+        'input_study', 'input_version', 'input_dataset', 'input_variable',
+        'output_study', 'output_version', 'output_dataset', 'output_variable',
+    ],
+    "codebook": ['study', 'dataset', 'version', 'variable'],
+}
+
+# Kind of identifier stored in key columns. Columns of the same kind share one set of
+# integer codes in .merge.KeyEncoder, so that tables can be merged on the codes.
+KEY_DOMAINS = {
+    "study": "study",
+    "input_study": "study",
+    "output_study": "study",
+    "questionnaire": "questionnaire",
+    "question": "question",
+    "item": "item",
+    "dataset": "dataset",
+    "input_dataset": "dataset",
+    "output_dataset": "dataset",
+    "variable": "variable",
+    "input_variable": "variable",
+    "output_variable": "variable",
+    "version": "version",
+    "input_version": "version",
+    "output_version": "version",
+}
+
 # These entries in the 'scales' column of table identify question items that have
 # survey data attached them.
 DATA_SCALES = ["bin", "int", "cat", "chr"]
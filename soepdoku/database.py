@@ -0,0 +1,267 @@
+import sqlite3
+from pathlib import Path
+import pandas as pd
+from .const import (
+    CSV_TYPE_TO_COLS,
+    QUESTIONS_KEYS,
+    LOGICALS_KEYS_IN,
+    LOGICALS_KEYS_OUT,
+    GENERATIONS_KEYS_IN,
+    GENERATIONS_KEYS_OUT,
+)
+from .reader import read_csv
+from .utils import file_fingerprint, stat_fingerprint
+
+# Tables of a MetadataDatabase
+DATABASE_CSV_TYPES = [
+    "questions",
+    "answers",
+    "variables",
+    "variable_categories",
+    "logical_variables",
+    "generations",
+]
+
+# Indexes of a MetadataDatabase by table
+DATABASE_INDEXES = {
+    "questions": [QUESTIONS_KEYS, ['study', 'questionnaire', 'answer_list']],
+    "answers": [['study', 'questionnaire', 'answer_list']],
+    "variables": [['dataset', 'variable', 'version'], ['variable']],
+    "variable_categories": [['dataset', 'variable', 'version']],
+    "logical_variables": [LOGICALS_KEYS_IN, LOGICALS_KEYS_OUT],
+    "generations": [
+        GENERATIONS_KEYS_IN + ['input_version'],
+        GENERATIONS_KEYS_OUT + ['output_version'],
+    ],
+}
+
+
+class MetadataDatabase:
+    """SQLite database of SOEP-style metadata. Tables correspond to CSV files and contain
+    their standard columns plus column 'source' with the path of the CSV file. Key columns
+    are indexed. Loading is incremental: only CSV files that changed since the last load
+    are read again.
+
+    Example:
+        db = MetadataDatabase("metadata.sqlite")
+        db.load("C:/Dokumentation")
+        db.variable_versions('plb0022_h')
+        db.answer_list_categories('soep-core-2022-selfempl', 'elb0301')
+    """
+
+    def __init__(self, path=':memory:'):
+        """Opens or creates a database.
+
+        Args:
+            path (Path or str, optional): SQLite database file. Defaults to ':memory:',
+                a database that is not stored.
+        """
+        self.path = str(path)
+        self.connection = sqlite3.connect(self.path)
+        for csvtype in DATABASE_CSV_TYPES:
+            columns = ', '.join(f'"{col}" TEXT' for col in CSV_TYPE_TO_COLS[csvtype])
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {csvtype} ({columns}, source TEXT NOT NULL)'
+            )
+            self.connection.execute(
+                f'CREATE INDEX IF NOT EXISTS {csvtype}_source ON {csvtype} (source)'
+            )
+            for k, keys in enumerate(DATABASE_INDEXES[csvtype]):
+                keys = ', '.join(f'"{col}"' for col in keys)
+                self.connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {csvtype}_keys{k} ON {csvtype} ({keys})'
+                )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                source TEXT PRIMARY KEY,
+                csvtype TEXT NOT NULL,
+                stat TEXT NOT NULL,
+                fingerprint TEXT NOT NULL
+            )"""
+        )
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def load(self, data):
+        """Loads CSV files into the database. Files that did not change since the last load
+        are skipped, and rows of changed files are replaced. If a directory is loaded, rows
+        of CSV files in the directory that no longer exist are removed.
+
+        Args:
+            data (Path, str, or list): Directory that is searched recursively for CSV files
+                named like a table, ex.: 'variables.csv', or a list of CSV files.
+
+        Returns:
+            dict: Number of files by status 'added', 'updated', 'unchanged', and 'removed'.
+
+        Raises:
+            ValueError: If a CSV file is of a type without table in the database.
+        """
+        status = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+
+        if isinstance(data, (str, Path)) and Path(data).is_dir():
+            directory = Path(data).resolve()
+            files = sorted(f for f in directory.rglob('*.csv') if f.stem in DATABASE_CSV_TYPES)
+        else:
+            directory = None
+            files = [Path(data)] if isinstance(data, (str, Path)) else [Path(f) for f in data]
+
+        known = {
+            source: (csvtype, stat, fingerprint)
+            for source, csvtype, stat, fingerprint in self.connection.execute("SELECT * FROM files")
+        }
+        for f in files:
+            source = str(f.resolve())
+            stat = stat_fingerprint(f)
+            if (source in known) and (known[source][1]==stat):
+                status['unchanged'] += 1
+                continue
+
+            fingerprint = file_fingerprint(f)
+            if (source in known) and (known[source][2]==fingerprint):
+                self.connection.execute("UPDATE files SET stat=? WHERE source=?", (stat, source))
+                status['unchanged'] += 1
+                continue
+
+            csvtype = f.stem if f.stem in DATABASE_CSV_TYPES else None
+            df = read_csv(f, csvtype=csvtype)
+            if df.csvtype not in DATABASE_CSV_TYPES:
+                print(f"{f} is of type '{df.csvtype}'. The database contains only tables {DATABASE_CSV_TYPES}.")
+                raise ValueError
+            self._remove_source(source)
+            self._insert(df, df.csvtype, source)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (source, df.csvtype, stat, fingerprint)
+            )
+            status['updated' if source in known else 'added'] += 1
+
+        # Files that were deleted from the directory
+        if directory is not None:
+            existing = {str(f.resolve()) for f in files}
+            for source in known:
+                if (source not in existing) and (directory in Path(source).parents):
+                    self._remove_source(source)
+                    status['removed'] += 1
+
+        self.connection.commit()
+        return status
+
+    def _insert(self, df, csvtype, source):
+        columns = CSV_TYPE_TO_COLS[csvtype]
+        rows = df.reindex(columns=columns, fill_value='').fillna('').astype(str)
+        rows = rows.assign(source=source)
+        placeholders = ', '.join('?' * (len(columns) + 1))
+        self.connection.executemany(
+            f"INSERT INTO {csvtype} VALUES ({placeholders})", rows.itertuples(index=False, name=None)
+        )
+
+    def _remove_source(self, source):
+        for csvtype in DATABASE_CSV_TYPES:
+            self.connection.execute(f"DELETE FROM {csvtype} WHERE source=?", (source,))
+        self.connection.execute("DELETE FROM files WHERE source=?", (source,))
+
+    def query(self, sql, params=()):
+        """Runs a SQL query.
+
+        Args:
+            sql (str): SQL query, ex.: "SELECT * FROM variables WHERE dataset=?".
+            params (tuple, optional): Parameters of the query. Defaults to ().
+
+        Returns:
+            DataFrame: Result of the query.
+        """
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def variable_versions(self, variable, dataset=None):
+        """Returns all versions of a variable in variables.csv.
+
+        Args:
+            variable (str): Name of the variable.
+            dataset (str, optional): Dataset of the variable. Defaults to None, all datasets.
+
+        Returns:
+            DataFrame: Rows of variables.csv sorted by dataset and version.
+        """
+        sql = "SELECT * FROM variables WHERE variable=?"
+        params = [variable]
+        if dataset is not None:
+            sql += " AND dataset=?"
+            params.append(dataset)
+        return self.query(sql + " ORDER BY dataset, version", params)
+
+    def variable_categories(self, dataset, variable, version=None):
+        """Returns the value labels of a variable.
+
+        Args:
+            dataset (str): Dataset of the variable.
+            variable (str): Name of the variable.
+            version (str, optional): Version of the dataset. Defaults to None, all versions.
+
+        Returns:
+            DataFrame: Rows of variable_categories.csv.
+        """
+        sql = "SELECT * FROM variable_categories WHERE dataset=? AND variable=?"
+        params = [dataset, variable]
+        if version is not None:
+            sql += " AND version=?"
+            params.append(version)
+        return self.query(sql, params)
+
+    def answer_list_categories(self, questionnaire, answer_list):
+        """Returns the answer categories of all items of a questionnaire that use an answer list.
+
+        Args:
+            questionnaire (str): Questionnaire, ex.: 'soep-core-2022-selfempl'.
+            answer_list (str): Name of the answer list.
+
+        Returns:
+            DataFrame: Columns 'study', 'questionnaire', 'question', 'item', 'answer_list',
+            'value', 'label_de', and 'label' with one row per item and category.
+        """
+        sql = """
+            SELECT q.study, q.questionnaire, q.question, q.item, q.answer_list,
+                a.value, a.label_de, a.label
+            FROM questions AS q
+            JOIN answers AS a
+                ON q.study=a.study AND q.questionnaire=a.questionnaire AND q.answer_list=a.answer_list
+            WHERE q.questionnaire=? AND q.answer_list=?
+        """
+        return self.query(sql, (questionnaire, answer_list))
+
+    def item_variables(self, study, questionnaire, question, item):
+        """Returns the variables in logical_variables.csv of a questionnaire item.
+
+        Returns:
+            DataFrame: Rows of logical_variables.csv.
+        """
+        sql = (
+            "SELECT * FROM logical_variables "
+            "WHERE study=? AND questionnaire=? AND question=? AND item=?"
+        )
+        return self.query(sql, (study, questionnaire, question, item))
+
+    def variable_generations(self, dataset, variable, version=None):
+        """Returns the rows of generations.csv with a variable as input.
+
+        Args:
+            dataset (str): Dataset of the input variable.
+            variable (str): Name of the input variable.
+            version (str, optional): Version of the input variable. Defaults to None.
+
+        Returns:
+            DataFrame: Rows of generations.csv.
+        """
+        sql = "SELECT * FROM generations WHERE input_dataset=? AND input_variable=?"
+        params = [dataset, variable]
+        if version is not None:
+            sql += " AND input_version=?"
+            params.append(version)
+        return self.query(sql, params)
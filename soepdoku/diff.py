@@ -0,0 +1,156 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .reader import read_csv
+from .utils import parallel_map
+
+# Tables compared by diff_release() with their key columns
+DIFF_KEYS = {
+    'variables': ['dataset', 'variable'],
+    'variable_categories': ['dataset', 'variable', 'value'],
+}
+
+# Columns of a release diff
+DIFF_COLUMNS = ['table', 'dataset', 'variable', 'value', 'change', 'fields']
+
+
+def diff_tables(old, new, keys, columns=None, ignore=('version',)):
+    """Compares two versions of a table row by row. Rows are matched by 'keys', and their
+    content is compared by hashes. Rows are classified as 'added', 'removed', or 'changed';
+    for changed rows, the changed columns are listed.
+
+    Args:
+        old (DataFrame): Old version of the table.
+        new (DataFrame): New version of the table.
+        keys (list of str): Columns that identify rows, ex.: ['dataset', 'variable'].
+        columns (list of str, optional): Columns that are compared. Defaults to None, all
+            columns of both tables except keys and 'ignore'.
+        ignore (tuple of str, optional): Columns that are not compared. Defaults to ('version',).
+
+    Returns:
+        DataFrame: Columns 'keys', 'change', and 'fields' (changed columns separated by ',').
+        Unchanged rows are not included. Of rows with duplicate keys, the first is compared.
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(list(old.columns) + list(new.columns)))
+        columns = [col for col in columns if (col not in keys) and (col not in ignore) and (col!='filter_parsed')]
+
+    old = _prepare(old, keys, columns)
+    new = _prepare(new, keys, columns)
+
+    merged = pd.merge(
+        old[keys + ['_hash']], new[keys + ['_hash']],
+        how='outer', on=keys, suffixes=('_old', '_new'), indicator=True, sort=False,
+    )
+    both = (merged['_merge']=='both').to_numpy()
+    changed = both & (merged['_hash_old'].to_numpy()!=merged['_hash_new'].to_numpy())
+
+    change = np.full(len(merged), '', dtype=object)
+    change[(merged['_merge']=='left_only').to_numpy()] = 'removed'
+    change[(merged['_merge']=='right_only').to_numpy()] = 'added'
+    change[changed] = 'changed'
+    fields = np.full(len(merged), '', dtype=object)
+
+    # Changed columns of changed rows
+    if changed.any():
+        keys_changed = merged.loc[changed, keys]
+        values_old = keys_changed.merge(old, how='left', on=keys)
+        values_new = keys_changed.merge(new, how='left', on=keys)
+        differs = np.column_stack([
+            values_old[col].to_numpy(dtype=object)!=values_new[col].to_numpy(dtype=object)
+            for col in columns
+        ])
+        names = np.array(columns, dtype=object)
+        fields[changed] = [','.join(names[row]) for row in differs]
+
+    result = merged[keys].assign(change=change, fields=fields)
+    result = result[result['change']!='']
+    return result.sort_values(keys, kind='stable', ignore_index=True)
+
+
+def _prepare(df, keys, columns):
+    """Selects key and compared columns as strings, drops duplicate keys, and adds the hash
+    of the compared columns."""
+    df = df.reindex(columns=keys + columns, fill_value='')
+    df = df.astype(object).where(df.notna(), '').astype(str)
+    df = df.drop_duplicates(subset=keys, keep='first')
+    if len(columns) > 0:
+        df['_hash'] = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    else:
+        df['_hash'] = 0
+    return df
+
+
+def diff_dataset(root, dataset, old_version, new_version):
+    """Compares variables.csv and variable_categories.csv of two versions of a dataset in a
+    metadata repository, ex.: 'datasets/pl/v39' and 'datasets/pl/v40'. Missing files are
+    treated as empty tables.
+
+    Args:
+        root (Path or str): Root directory of the metadata repository.
+        dataset (str): Name of the dataset directory.
+        old_version (str): Old version, ex.: 'v39'.
+        new_version (str): New version, ex.: 'v40'.
+
+    Returns:
+        DataFrame: Columns 'table', 'dataset', 'variable', 'value', 'change', and 'fields'.
+    """
+    results = []
+    for csvtype, keys in DIFF_KEYS.items():
+        old = _read_or_empty(Path(root) / 'datasets' / dataset / old_version / f"{csvtype}.csv", csvtype)
+        new = _read_or_empty(Path(root) / 'datasets' / dataset / new_version / f"{csvtype}.csv", csvtype)
+        if (old is None) and (new is None):
+            continue
+        old = pd.DataFrame(columns=keys) if old is None else old
+        new = pd.DataFrame(columns=keys) if new is None else new
+        result = diff_tables(old, new, keys)
+        results.append(result.assign(table=csvtype).reindex(columns=DIFF_COLUMNS, fill_value=''))
+
+    if len(results)==0:
+        return pd.DataFrame(columns=DIFF_COLUMNS)
+    return pd.concat(results, ignore_index=True)
+
+
+def diff_release(root, old_version, new_version, datasets=None, n_jobs=1):
+    """Compares two releases of all datasets in a metadata repository. Datasets are compared
+    one at a time in a pool of processes, so that memory is bounded by the largest dataset.
+
+    Example:
+        changes = diff_release("C:/Dokumentation", 'v39', 'v40', n_jobs=4)
+        changes[changes['change']=='changed']
+
+    Args:
+        root (Path or str): Root directory of the metadata repository.
+        old_version (str): Old version, ex.: 'v39'.
+        new_version (str): New version, ex.: 'v40'.
+        datasets (list of str, optional): Datasets to be compared. Defaults to None, all
+            datasets with a directory of either version.
+        n_jobs (int, optional): Number of processes. Defaults to 1.
+
+    Returns:
+        DataFrame: Columns 'table', 'dataset', 'variable', 'value', 'change', and 'fields'.
+    """
+    root = Path(root)
+    if datasets is None:
+        datasets = sorted(
+            d.name for d in (root / 'datasets').iterdir()
+            if (d / old_version).is_dir() or (d / new_version).is_dir()
+        )
+    args = [(root, dataset, old_version, new_version) for dataset in datasets]
+
+    results = parallel_map(_diff_dataset_args, args, n_jobs=n_jobs)
+
+    results = [r for r in results if len(r) > 0]
+    if len(results)==0:
+        return pd.DataFrame(columns=DIFF_COLUMNS)
+    return pd.concat(results, ignore_index=True)
+
+
+def _diff_dataset_args(args):
+    return diff_dataset(*args)
+
+
+def _read_or_empty(csvfile, csvtype):
+    if not csvfile.exists():
+        return None
+    return read_csv(csvfile, csvtype=csvtype)
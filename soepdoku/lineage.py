@@ -0,0 +1,192 @@
+import pickle
+from pathlib import Path
+import pandas as pd
+from .const import LOGICALS_KEYS_IN, LOGICALS_KEYS_OUT, GENERATIONS_KEYS_OUT
+from .merge import get_generations_lineage
+from .reader import read_csv
+from .utils import file_fingerprint
+
+# Format of stored lineage indexes. Increase if the stored content changes.
+LINEAGE_INDEX_FORMAT = 1
+
+
+class LineageIndex:
+    """Prebuilt lineage of questionnaire items and dataset variables. The index assigns
+    each item in logical_variables.csv all output variables in logical_variables.csv and
+    generations.csv, and vice versa. Lookups are dictionary lookups.
+
+    Example:
+        index = LineageIndex.from_csv(
+            logicals_csv="logical_variables.csv",
+            generations_csv="generations.csv",
+            index_file="lineage.pickle",
+        )
+        index.outputs('soep-core', 'soep-core-2022-selfempl', '1', 'elb0301_v2')
+        # [('selfempl', 'elb0301_v2', 'v0'), ('selfempl2022', 'elb0301_v2', 'v39')]
+        index.sources('selfempl2022', 'elb0301_v2', 'v39')
+        # [('soep-core', 'soep-core-2022-selfempl', '1', 'elb0301_v2')]
+    """
+
+    def __init__(self, forward=None, reverse=None, fingerprints=None):
+        """Creates a LineageIndex.
+
+        Args:
+            forward (dict, optional): Dictionary of form {(study, questionnaire, question, item):
+                [(dataset, variable, version), ...]}. Defaults to None.
+            reverse (dict, optional): Dictionary of form {(dataset, variable, version):
+                [(study, questionnaire, question, item), ...]}. Defaults to None.
+            fingerprints (tuple, optional): Fingerprints of the input files the index was
+                built from. Defaults to None.
+        """
+        self.forward = forward if forward is not None else {}
+        self.reverse = reverse if reverse is not None else {}
+        self.fingerprints = fingerprints
+
+        # Reverse lookup without version
+        self._reverse_nv = {}
+        for (dataset, variable, _), items in self.reverse.items():
+            self._reverse_nv.setdefault((dataset, variable), []).extend(items)
+
+    def __len__(self):
+        return len(self.forward)
+
+    @classmethod
+    def from_dataframes(cls, logicals, generations, fingerprints=None):
+        """Builds a LineageIndex from logical_variables.csv and generations.csv.
+
+        Args:
+            logicals (DataFrame): SOEP Dokumentation logical_variables.csv.
+            generations (DataFrame): SOEP Dokumentation generations.csv.
+            fingerprints (tuple, optional): Fingerprints of the input files. Defaults to None.
+
+        Returns:
+            LineageIndex
+        """
+        _items = LOGICALS_KEYS_IN.copy()
+        _outputs = ['output_dataset', 'output_variable', 'output_version']
+        mapper = {k1: k2 for k1, k2 in zip(LOGICALS_KEYS_OUT, GENERATIONS_KEYS_OUT)}
+
+        logicals = logicals[_items + LOGICALS_KEYS_OUT].drop_duplicates()
+
+        # Logical variables, which have internal version v0
+        outputs_logicals = logicals.rename(columns=mapper)
+        outputs_logicals['output_version'] = 'v0'
+
+        # Generations downstream of logical variables
+        lineage = get_generations_lineage(logicals, generations, merge_on_version=True)
+        outputs_generations = pd.merge(logicals, lineage, how='inner', on=LOGICALS_KEYS_OUT)
+
+        data = pd.concat(
+            [outputs_logicals[_items + _outputs], outputs_generations[_items + _outputs]],
+            ignore_index=True,
+        ).drop_duplicates()
+
+        forward = {}
+        reverse = {}
+        for row in data.itertuples(index=False, name=None):
+            item, output = row[:4], row[4:]
+            forward.setdefault(item, []).append(output)
+            reverse.setdefault(output, []).append(item)
+
+        return cls(forward=forward, reverse=reverse, fingerprints=fingerprints)
+
+    @classmethod
+    def from_csv(cls, logicals_csv, generations_csv, index_file=None):
+        """Loads a LineageIndex from 'index_file' if the index was built from the current
+        content of the CSV files. Otherwise, the index is built and stored in 'index_file'.
+
+        Args:
+            logicals_csv (Path or str, or list): logical_variables.csv. A list of files is concatenated.
+            generations_csv (Path or str, or list): generations.csv. A list of files is concatenated.
+            index_file (Path or str, optional): File in which the index is stored. If None,
+                the index is always built and not stored. Defaults to None.
+
+        Returns:
+            LineageIndex
+        """
+        if isinstance(logicals_csv, (str, Path)):
+            logicals_csv = [logicals_csv]
+        if isinstance(generations_csv, (str, Path)):
+            generations_csv = [generations_csv]
+
+        fingerprints = (
+            tuple(file_fingerprint(f) for f in logicals_csv),
+            tuple(file_fingerprint(f) for f in generations_csv),
+        )
+
+        if (index_file is not None) and Path(index_file).exists():
+            index = cls.load(index_file)
+            if (index is not None) and (index.fingerprints == fingerprints):
+                return index
+
+        logicals = pd.concat(
+            [read_csv(f, csvtype='logical_variables') for f in logicals_csv], ignore_index=True
+        )
+        generations = pd.concat(
+            [read_csv(f, csvtype='generations') for f in generations_csv], ignore_index=True
+        )
+        index = cls.from_dataframes(logicals, generations, fingerprints=fingerprints)
+
+        if index_file is not None:
+            index.save(index_file)
+        return index
+
+    def save(self, index_file):
+        """Stores the index in a file.
+
+        Args:
+            index_file (Path or str): File in which the index is stored.
+        """
+        content = {
+            'format': LINEAGE_INDEX_FORMAT,
+            'fingerprints': self.fingerprints,
+            'forward': self.forward,
+            'reverse': self.reverse,
+        }
+        with open(index_file, 'wb') as f:
+            pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, index_file):
+        """Loads an index from a file.
+
+        Args:
+            index_file (Path or str): File in which the index is stored.
+
+        Returns:
+            LineageIndex: The index, or None if the file has an outdated format.
+        """
+        with open(index_file, 'rb') as f:
+            content = pickle.load(f)
+        if content.get('format') != LINEAGE_INDEX_FORMAT:
+            return None
+        return cls(
+            forward=content['forward'],
+            reverse=content['reverse'],
+            fingerprints=content['fingerprints'],
+        )
+
+    def outputs(self, study, questionnaire, question, item):
+        """Returns all output variables of a questionnaire item.
+
+        Returns:
+            list of tuple: List of (dataset, variable, version). Variables in
+            logical_variables.csv have version 'v0'.
+        """
+        return self.forward.get((study, questionnaire, question, item), [])
+
+    def sources(self, dataset, variable, version=None):
+        """Returns all questionnaire items from which a variable is generated.
+
+        Args:
+            dataset (str): Dataset of the variable.
+            variable (str): Name of the variable.
+            version (str, optional): Version of the dataset. If None, items of all
+                versions are returned. Defaults to None.
+
+        Returns:
+            list of tuple: List of (study, questionnaire, question, item).
+        """
+        if version is None:
+            return list(dict.fromkeys(self._reverse_nv.get((dataset, variable), [])))
+        return self.reverse.get((dataset, variable, version), [])
@@ -0,0 +1,180 @@
+import sqlite3
+import threading
+from pathlib import Path
+import pandas as pd
+
+
+def glossary_fingerprint(glossary):
+    """Computes a fingerprint of a glossary. Glossaries with identical entries have
+    identical fingerprints, irrespective of the order of entries.
+
+    Args:
+        glossary (dict or None): Dictionary of terms, ex.: {'Anteil': 'share'}.
+
+    Returns:
+        str: Hexadecimal SHA-1 digest, or '' if glossary is None or empty.
+    """
+    import hashlib
+
+    if not glossary:
+        return ''
+    content = '\n'.join(f"{k}\t{v}" for k, v in sorted(glossary.items()))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """Persistent store of translations in a SQLite database. Translations are keyed
+    by source text, source language, target language, and the fingerprint of the
+    glossary they were made with.
+
+    Example:
+        memory = TranslationMemory("translations.sqlite")
+        memory.seed(soep.read_csv("variables.csv"), source_target={'label_de': 'label'})
+        translator = soep.Translator(service='deepl', auth_key=key, memory=memory)
+    """
+
+    def __init__(self, path=':memory:'):
+        """Opens or creates a translation memory.
+
+        Args:
+            path (Path or str, optional): SQLite database file. Defaults to ':memory:',
+                a memory that is not stored.
+        """
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS translations (
+                source_text TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                glossary TEXT NOT NULL,
+                target_text TEXT NOT NULL,
+                PRIMARY KEY (source_text, source_lang, target_lang, glossary)
+            )"""
+        )
+        self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, texts, source_lang, target_lang, glossary=''):
+        """Looks up translations of texts. Updates the counters of hits and misses.
+
+        Args:
+            texts (list of str): Source texts.
+            source_lang (str): Source language, ex.: 'DE'.
+            target_lang (str): Target language, ex.: 'EN-US'.
+            glossary (str, optional): Fingerprint of glossary, see glossary_fingerprint().
+                Defaults to ''.
+
+        Returns:
+            dict: Dictionary of source text to translation for texts found in memory.
+        """
+        texts = list(dict.fromkeys(texts))
+        result = {}
+        with self._lock:
+            for i in range(0, len(texts), 500):  # SQLite limits the number of parameters
+                chunk = texts[i:i+500]
+                rows = self._connection.execute(
+                    f"""SELECT source_text, target_text FROM translations
+                    WHERE source_lang=? AND target_lang=? AND glossary=?
+                    AND source_text IN ({','.join('?' * len(chunk))})""",
+                    [source_lang, target_lang, glossary] + chunk,
+                ).fetchall()
+                result.update(rows)
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        return result
+
+    def put(self, translations, source_lang, target_lang, glossary=''):
+        """Stores translations. Existing translations of the same texts are replaced.
+
+        Args:
+            translations (dict): Dictionary of source text to translation.
+            source_lang (str): Source language, ex.: 'DE'.
+            target_lang (str): Target language, ex.: 'EN-US'.
+            glossary (str, optional): Fingerprint of glossary. Defaults to ''.
+        """
+        rows = [
+            (text, source_lang, target_lang, glossary, translation)
+            for text, translation in translations.items()
+        ]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._connection.commit()
+
+    def seed(
+            self,
+            data,
+            source_target=None,
+            source_lang='DE',
+            target_lang='EN-US',
+            glossary=None,
+        ):
+        """Stores existing translations of SOEP-style metadata. Only rows where both source
+        and target column contain text are stored.
+
+        Args:
+            data (DataFrame, Path, str, or list): Metadata or CSV files, ex.: a list of
+                variables.csv and variable_categories.csv of the previous version.
+            source_target (dict, optional): Dictionary of source and target columns.
+                Columns that are missing in a file are skipped. Defaults to
+                {'label_de': 'label', 'text_de': 'text', 'instruction_de': 'instruction'}.
+            source_lang (str, optional): Source language. Defaults to 'DE'.
+            target_lang (str, optional): Target language. Defaults to 'EN-US'.
+            glossary (dict, optional): Glossary the translations adhere to. Defaults to None.
+
+        Returns:
+            int: Number of stored translations.
+        """
+        translations = bilingual_pairs(data, source_target)
+        self.put(translations, source_lang, target_lang, glossary_fingerprint(glossary))
+        return len(translations)
+
+
+def bilingual_pairs(data, source_target=None):
+    """Collects pairs of source text and translation from SOEP-style metadata. Only rows
+    where both source and target column contain text are used.
+
+    Args:
+        data (DataFrame, Path, str, or list): Metadata or CSV files.
+        source_target (dict, optional): Dictionary of source and target columns. Columns
+            that are missing in a file are skipped. Defaults to
+            {'label_de': 'label', 'text_de': 'text', 'instruction_de': 'instruction'}.
+
+    Returns:
+        dict: Dictionary of source text to translation. Later rows take precedence.
+    """
+    from .reader import read_csv
+
+    if source_target is None:
+        source_target = {'label_de': 'label', 'text_de': 'text', 'instruction_de': 'instruction'}
+    if isinstance(data, (pd.DataFrame, str, Path)):
+        data = [data]
+
+    translations = {}
+    for df in data:
+        if not isinstance(df, pd.DataFrame):
+            df = read_csv(df)
+        for source, target in source_target.items():
+            if (source not in df.columns) or (target not in df.columns):
+                continue
+            pairs = df[[source, target]].fillna('').astype(str)
+            mask = (pairs[source].str.strip()!='') & (pairs[target].str.strip()!='')
+            translations.update(zip(pairs.loc[mask, source], pairs.loc[mask, target]))
+    return translations
@@ -6,8 +6,10 @@ from soepdoku.const import (
     LOGICALS_KEYS_IN,
     LOGICALS_KEYS_OUT,
     GENERATIONS_KEYS_IN,
-    GENERATIONS_KEYS_OUT
+    GENERATIONS_KEYS_OUT,
+    KEY_DOMAINS,
 )
+from soepdoku.similarity import NGramIndex, parallel_best_matches, _concat_columns_to_array
 
 def merge_quest_log_gen(
         questionnaire,
@@ -21,7 +23,7 @@ def merge_quest_log_gen(
     ):
     """Merges questionnaire <- logicals <- generations with the goal to assign all
     output_dataset and output_variable in logicals and generations to the items of a 
-    questionnaire.
+    questionnaire. None of the input DataFrames is modified.
 
     Parameters
     ----------
@@ -44,259 +46,663 @@ def merge_quest_log_gen(
     Returns
     -------
     DataFrame
-        DataFrame has new column 'output' that contains lists of output datasets and variables.
-        Ex.: ['selfempl/elb0001_v1', 'selfempl2022/elb0001'].
-        DataFrame may have more rows than initial questionnaire if an input variable has multiple 
-        output variables
+        DataFrame with the key columns of the questionnaire and new column 'output' that
+        contains comma-separated output datasets and variables.
+        Ex.: 'v0/selfempl/elb0001_v1,v39/selfempl2022/elb0001'.
     
     """
-    
-    if filter_dataset is None:
-        filter_dataset = []
-    
-    if filter_version is None:
-        filter_version = []
-    elif 'v0' not in filter_version:
-        filter_version.append('v0') # v0 is internal version of logical_variables.csv
 
-    
-    # Check user input
-    for df, columns, type in [
-        (questionnaire, QUESTIONS_KEYS, 'questions.csv'), 
-        (logicals, LOGICALS_KEYS_IN + LOGICALS_KEYS_OUT, 'logical_variables.csv'), 
-        (generations, GENERATIONS_KEYS_IN + GENERATIONS_KEYS_OUT, 'generations.csv')]:
-        try:
-            assert(_columns_in_df(df, columns))
-        except AssertionError:
-            print(f"{type} does not have the required columns '{columns}'")
-            raise
-
-    # Pass global merge keys to internal keys
-    _questions_keys = QUESTIONS_KEYS.copy()
-    _logicals_keys_in = LOGICALS_KEYS_IN.copy()
-    _logicals_keys_out = LOGICALS_KEYS_OUT.copy()
-    _generations_keys_in = GENERATIONS_KEYS_IN.copy()
-    _generations_keys_out = GENERATIONS_KEYS_OUT.copy()
-    _generations_keys_in_nv = GENERATIONS_KEYS_IN.copy()
-    _generations_keys_out_nv = GENERATIONS_KEYS_OUT.copy()
-
-    # Add version column to merge keys
-    if merge_on_version==True:
-        if 'input_version' not in _generations_keys_in:
+    merger = LineageMerger(logicals, generations, merge_on_version=merge_on_version)
+    return merger.merge(
+        questionnaire,
+        filter_dataset=filter_dataset,
+        filter_version=filter_version,
+        show_dataset=show_dataset,
+        show_version=show_version,
+    )
+
+
+def merge_quest_log_gen_batch(
+        questionnaires,
+        logicals,
+        generations,
+        filter_dataset=None,
+        filter_version=None,
+        show_dataset=True,
+        show_version=True,
+        merge_on_version=True,
+    ):
+    """Merges many questionnaires <- logicals <- generations in one pass. logicals and
+    generations are preprocessed only once. See merge_quest_log_gen() for the parameters.
+
+    Parameters
+    ----------
+    questionnaires : DataFrame or dict of DataFrame
+        Concatenated questions.csv of several questionnaires, or dictionary of
+        questions.csv. Ex.: {'soep-core-2021-pe': df1, 'soep-core-2022-pe': df2}
+
+    Returns
+    -------
+    DataFrame or dict of DataFrame
+        Result of merge_quest_log_gen() for every questionnaire. If 'questionnaires' is
+        a dictionary, a dictionary with the same keys is returned.
+    """
+
+    merger = LineageMerger(logicals, generations, merge_on_version=merge_on_version)
+    options = {
+        'filter_dataset': filter_dataset,
+        'filter_version': filter_version,
+        'show_dataset': show_dataset,
+        'show_version': show_version,
+    }
+
+    if not isinstance(questionnaires, dict):
+        return merger.merge(questionnaires, **options)
+
+    names = list(questionnaires.keys())
+    if len(names)==0:
+        return {}
+    frames = [questionnaires[name][QUESTIONS_KEYS] for name in names]
+    data = merger.merge(pd.concat(frames, ignore_index=True), **options)
+
+    # Split result into questionnaires
+    result = {}
+    bounds = np.cumsum([0] + [len(df) for df in frames])
+    for name, df, start, end in zip(names, frames, bounds[:-1], bounds[1:]):
+        result[name] = data.iloc[start:end].set_axis(df.index, axis=0)
+    return result
+
+
+class LineageMerger:
+    """Assigns all output datasets and variables in logical_variables.csv and generations.csv
+    to questionnaire items. logical_variables.csv and generations.csv are encoded and their
+    lineage is computed once when the LineageMerger is created. Afterwards, any number of
+    questionnaires can be merged.
+    """
+
+    def __init__(self, logicals, generations, merge_on_version=True):
+        """Preprocesses logical_variables.csv and generations.csv.
+
+        Args:
+            logicals (DataFrame): SOEP Dokumentation logical_variables.csv.
+            generations (DataFrame): SOEP Dokumentation generations.csv.
+            merge_on_version (bool, optional): If True, generations are followed by version,
+                dataset and variable. Defaults to True.
+        """
+
+        # Pass global merge keys to internal keys
+        self.logicals_keys_in = LOGICALS_KEYS_IN.copy()
+        self.logicals_keys_out = LOGICALS_KEYS_OUT.copy()
+        _generations_keys_in = GENERATIONS_KEYS_IN.copy()
+        _generations_keys_out = GENERATIONS_KEYS_OUT.copy()
+        self.merge_on_version = merge_on_version
+
+        # Add version column to merge keys
+        if merge_on_version==True:
             _generations_keys_in = ['input_version'] + _generations_keys_in
-        if 'output_version' not in _generations_keys_out:
             _generations_keys_out = ['output_version'] + _generations_keys_out
-    
-    questionnaire['initial_index'] = questionnaire.index
-    questionnaires_temp = questionnaire[_questions_keys + ['initial_index']]
-    logicals_temp = logicals[_logicals_keys_in + _logicals_keys_out]
-    generations_temp = generations[_generations_keys_in + _generations_keys_out]
-
-    ### Merge questionnaire <- logical_variables
-    data = pd.merge(
-        questionnaires_temp, 
-        logicals_temp, 
-        how='left',
-        left_on=_questions_keys,  # question, item
-        right_on=_logicals_keys_in # question, item
-    )
+        self.generations_keys_out = _generations_keys_out
 
-    ### Merge logical_variables <- generations
-    data = pd.merge(
-        data,
-        generations_temp,
-        how='left',
-        left_on=_logicals_keys_out, # dataset, variable
-        right_on=_generations_keys_in_nv, # input_dataset, input_variable
-    )
+        # Check user input
+        _check_columns(logicals, self.logicals_keys_in + self.logicals_keys_out, 'logical_variables.csv')
+        _check_columns(generations, _generations_keys_in + _generations_keys_out, 'generations.csv')
 
-    # Name output variables in logicals as in generations
-    mapper = {
-        k1: k2 + '_0'
-        for k1, k2 
-        in zip(_logicals_keys_out, _generations_keys_out_nv) # dataset, variable -> output_dataset_0, output_variable_0
-    }   
-    data.rename(columns=mapper, inplace=True)
-    if merge_on_version==True:
-        data['output_version_0'] = 'v0' # logicals has no output_version
-
-    ### Merge generations iteratively as long as new output variables are found
-    new_output_found = True
-    count = 1 # output counter
-    while new_output_found:
-        
-        # Add more output_variables
+        ### Encode identifier columns of all tables with a shared set of integer codes
+        self.encoder = KeyEncoder().fit(
+            logicals[self.logicals_keys_in + self.logicals_keys_out],
+            generations[_generations_keys_in + _generations_keys_out],
+            version=['v0'], # v0 is internal version of logical_variables.csv
+        )
+        logicals_codes = self.encoder.encode(logicals, self.logicals_keys_in + self.logicals_keys_out)
+        logicals_codes = logicals_codes[(logicals_codes[self.logicals_keys_in]>=0).all(axis=1)]
+        logicals_codes['key'] = self.encoder.combine(logicals_codes, self.logicals_keys_in)
+        self.logicals = logicals_codes[['key'] + self.logicals_keys_out].drop_duplicates()
+
+        ### Find all generations downstream of the logical variables
+        self.graph = GenerationsGraph(generations, merge_on_version=merge_on_version, encoder=self.encoder)
+        self.lineage = _get_generations_lineage_codes(
+            self.logicals.loc[(self.logicals[self.logicals_keys_out]>=0).all(axis=1), self.logicals_keys_out],
+            self.encoder.encode(generations, GENERATIONS_KEYS_IN + _generations_keys_out),
+            self.graph,
+        )
+
+    def merge(
+            self,
+            questionnaire,
+            filter_dataset=None,
+            filter_version=None,
+            show_dataset=True,
+            show_version=True,
+        ):
+        """Merges questionnaire <- logicals <- generations. See merge_quest_log_gen() for
+        the parameters. The questionnaire may contain items of several questionnaires.
+
+        Returns:
+            DataFrame: DataFrame with the key columns of the questionnaire and new column 'output'.
+        """
+
+        _questions_keys = QUESTIONS_KEYS.copy()
+        _logicals_keys_out = self.logicals_keys_out
+        _generations_keys_out = self.generations_keys_out
+        encoder = self.encoder
+
+        if filter_dataset is None:
+            filter_dataset = []
+
+        if filter_version is None:
+            filter_version = []
+        elif 'v0' not in filter_version:
+            filter_version = list(filter_version) + ['v0'] # v0 is internal version of logical_variables.csv
+
+        # Check user input
+        _check_columns(questionnaire, _questions_keys, 'questions.csv')
+
+        # Items whose keys are unknown to logical_variables.csv get key -1
+        questions_codes = encoder.encode(questionnaire, _questions_keys)
+        questions_key = np.where(
+            (questions_codes>=0).all(axis=1),
+            encoder.combine(questions_codes, _questions_keys),
+            -1,
+        )
+
+        ### Merge questionnaire <- logical_variables
         data = pd.merge(
-            data, 
-            generations_temp, 
+            pd.DataFrame({'row': np.arange(len(questionnaire)), 'key': questions_key}),
+            self.logicals,
             how='left',
-            left_on=_generations_keys_out, # output_dataset, output_variable
-            right_on=_generations_keys_in, # input_dataset, input_variable
-            suffixes=('_'+str(count), '') # output_dataset, output_variable -> output_dataset_i, output_variable_i
+            on='key', # study, questionnaire, question, item
         )
-        
-        new_output_found = not left_data_contains_right_data(data, count, columns=_generations_keys_out)
-
-        count +=1
-    
-    # Rename, ex: key1: key1_4, key2: key2_4, if count = 4
-    data.rename(columns={c: c + '_' + str(count) for c in _generations_keys_out}, inplace=True)
-  
-    # Get column names
-    columns = [[c + '_' + str(i) for c in _generations_keys_out] for i in range(count+1)]
-    columns_flat = [i for lst in columns for i in lst]
-
-    # Filter data by filter_dataset
-    if bool(filter_dataset):
-        data = apply_filter(
-            data, 
-            output_columns=columns, 
-            filter_column='output_dataset', 
-            filter=filter_dataset
+        data[_logicals_keys_out] = data[_logicals_keys_out].fillna(-1).astype(np.int64)
+
+        ### Collect logical variables and generations in long format, one output per row
+        # Name output variables in logicals as in generations
+        mapper = {
+            k1: k2
+            for k1, k2 
+            in zip(_logicals_keys_out, GENERATIONS_KEYS_OUT) # dataset, variable -> output_dataset, output_variable
+        }
+        outputs_logicals = data.rename(columns=mapper)
+        if self.merge_on_version==True:
+            outputs_logicals['output_version'] = encoder.encode_values('version', ['v0'])[0]
+
+        outputs_generations = pd.merge(
+            data,
+            self.lineage,
+            how='inner',
+            on=_logicals_keys_out,
         )
-    
-    # Filter data by filter_version
-    if bool(filter_version):
-        data = apply_filter(
-            data, 
-            output_columns=columns, 
-            filter_column='output_version', 
-            filter=filter_version
+        data = pd.concat(
+            [outputs_logicals[['row'] + _generations_keys_out], outputs_generations[['row'] + _generations_keys_out]],
+            ignore_index=True,
         )
 
-    # Remove dataset names 
-    if show_dataset==False:
-        data = remove_column_from_output(data, column='output_dataset', end=count+1)
-
-    if show_version==False:
-        data = remove_column_from_output(data, column='output_version', end=count+1)
-    
-    # Collect content of merged columns in single columnn
-    data['output'] = data[columns_flat].apply(
-            lambda x: concat_str_cols_twice(x, columns), axis=1
+        # Filter data by filter_dataset
+        if bool(filter_dataset):
+            data = apply_filter(
+                data, 
+                output_columns=_generations_keys_out, 
+                filter_column='output_dataset', 
+                filter=_known(encoder.encode_values('dataset', filter_dataset)),
+                empty=-1,
+            )
+        
+        # Filter data by filter_version
+        if bool(filter_version):
+            data = apply_filter(
+                data, 
+                output_columns=_generations_keys_out, 
+                filter_column='output_version', 
+                filter=_known(encoder.encode_values('version', filter_version)),
+                empty=-1,
+            )
+
+        # Remove dataset names 
+        if show_dataset==False:
+            data = remove_column_from_output(data, column='output_dataset', empty=-1)
+
+        if show_version==False:
+            data = remove_column_from_output(data, column='output_version', empty=-1)
+
+        # Remove duplicate and empty outputs before decoding
+        data = data[(data[_generations_keys_out]>=0).any(axis=1)].drop_duplicates()
+        
+        # Collect content of output columns in single columnn
+        data['output'] = concat_str_cols(
+            encoder.decode(data, _generations_keys_out), _generations_keys_out, sep='/'
         )
-    drop_columns = columns_flat + _generations_keys_in
-    data.drop(columns=drop_columns, inplace=True)
-    
-    # Concatenate rows 
-    data = data.groupby(_questions_keys, as_index=False)['output'].apply(lambda x: concat(x))
-   
-    # Remove leading ,
-    data['output'] = data['output'].str.lstrip(to_strip=',')
-
-    # Get initial sorting
-    data = data.merge(questionnaires_temp, how='left', on=QUESTIONS_KEYS)
-    data = data.sort_values(by=['initial_index']).drop(columns=['initial_index'])
 
-    return data
+        # Concatenate unique outputs of each item
+        outputs = join_str_groups(
+            data.loc[data['output']!="", ['row', 'output']].drop_duplicates(),
+            by=['row'],
+            column='output',
+            sep=',',
+        )
 
+        # Keep initial sorting
+        result = questionnaire[_questions_keys].copy()
+        output = np.full(len(questionnaire), "", dtype=object)
+        output[outputs['row'].to_numpy()] = outputs['output'].to_numpy()
+        result['output'] = output
+        return result
 
-def concat(aseries):
-    return ','.join(set([i for li in aseries for i in li.split(',')]))
 
+def get_generations_lineage(variables, generations, merge_on_version=True):
+    """Finds all generations downstream of variables from logical_variables.csv.
 
+    Parameters
+    ----------
+    variables : DataFrame
+        DataFrame with columns 'dataset' and 'variable' of logical_variables.csv.
+    generations : DataFrame
+        SOEP Dokumentation generations.csv.
+    merge_on_version : bool
+        If True, generations are followed by version, dataset and variable.
 
-def left_data_contains_right_data(data, count, columns=None):
-    """Checks if merged left data contains merged right data 
+    Returns
+    -------
+    DataFrame
+        DataFrame with columns 'dataset', 'variable' and the output keys of generations.csv.
+        One row per variable and downstream generation.
     """
 
-    if columns == None:
-        return True
-    
-    import numpy as np
+    graph = GenerationsGraph(generations, merge_on_version=merge_on_version)
+    encoder = graph.encoder.fit(variables[LOGICALS_KEYS_OUT])
 
-    result = np.ones(shape=(data.shape[0], count))
+    variables_codes = encoder.encode(variables, LOGICALS_KEYS_OUT)
+    lineage = _get_generations_lineage_codes(
+        variables_codes[(variables_codes>=0).all(axis=1)],
+        encoder.encode(generations, GENERATIONS_KEYS_IN + graph.keys_out),
+        graph,
+    )
+    return encoder.decode(lineage, LOGICALS_KEYS_OUT + graph.keys_out)
 
-    new_columns = columns
 
-     # Is any old column same as new column? -> New column contains no new information
-    for i in range(1, count): # exclude 0, which is output from logical_variables
-        old_columns = [c + '_' + str(i) for c in columns]
-        result[:, i] = columns_equal(data[old_columns], data[new_columns])
-    
-    # Columns empty?
-    result[:, -1] = ((data[new_columns]=="") | (data[new_columns].isna())).any(axis=1)  
-    
-    # Return true if new columns are equal to at least one of the old columns for all rows
-    return result.any(axis=1).all()
+def _get_generations_lineage_codes(variables, generations, graph):
+    """Finds all generations downstream of variables. Works on integer codes of graph.encoder.
 
-def columns_equal(df1, df2):
-
-    """Compares the columns of two dataframes of same shape. Compares row by row.
-    Column names are ignored.
-    
     Parameters
     ----------
-    df1 : DataFrame
-        DataFrame of shape N x K 
-    df2 : DataFrame
-        DataFrame of shape N x K
+    variables : DataFrame
+        Codes of columns 'dataset' and 'variable'.
+    generations : DataFrame
+        Codes of columns 'input_dataset', 'input_variable' and graph.keys_out.
+    graph : GenerationsGraph
 
     Returns
     -------
-    DataFrame of boolean values
-        DataFrame has shape N x 1. Is True for row n if all K columns of df1[n] and df2[n] are equal
+    DataFrame
+        Codes of columns 'dataset', 'variable' and graph.keys_out.
+    """
 
+    _logicals_keys_out = LOGICALS_KEYS_OUT.copy()
+    encoder = graph.encoder
+
+    cycles = graph.find_cycles()
+    if len(cycles) > 0:
+        print(
+            f"generations.csv contains cycles. {len(cycles)} variables are part of or "
+            "downstream of a cycle."
+        )
+
+    # Every distinct variable is a group of the breadth-first search
+    logical_vars = variables[_logicals_keys_out].drop_duplicates().reset_index(drop=True)
+
+    # First generation: logical_variables.csv has no version. Inputs of all versions are merged.
+    first = pd.merge(
+        pd.DataFrame({
+            'group': np.arange(len(logical_vars)),
+            'key': encoder.combine(logical_vars, _logicals_keys_out), # dataset, variable
+        }),
+        pd.DataFrame({
+            'key': encoder.combine(generations, GENERATIONS_KEYS_IN), # input_dataset, input_variable
+            'node': graph.encode_codes(generations),
+        }),
+        how='inner',
+        on='key',
+    )
+    groups, nodes = graph.descendants(first['group'].to_numpy(), first['node'].to_numpy())
+
+    lineage = logical_vars.iloc[groups].reset_index(drop=True)
+    lineage[graph.keys_out] = graph.node_codes.iloc[nodes].to_numpy()
+    return lineage
+
+
+class KeyEncoder:
+    """Encodes identifier columns of SOEP metadata tables as integer codes. Columns with
+    the same kind of identifier share one set of categories (see const.KEY_DOMAINS), ex.:
+    'dataset', 'input_dataset', and 'output_dataset'. Tables can then be merged on compact
+    integer codes, and strings are decoded only for output.
     """
 
-    # Make column names equal
-    d2tmp = df2.rename(columns={c2: c1 for c1, c2 in zip(df1.columns, df2.columns)})
-    return (df1==d2tmp).all(axis=1)
+    def __init__(self, domains=None):
+        """Creates a KeyEncoder.
+
+        Args:
+            domains (dict, optional): Dictionary of column name to kind of identifier.
+                Defaults to const.KEY_DOMAINS.
+        """
+        if domains is None:
+            domains = KEY_DOMAINS
+        self.domains = domains
+        self.categories = {}
+
+    def fit(self, *dfs, **values):
+        """Adds the values of all identifier columns in 'dfs' to the categories. Codes
+        of existing categories do not change.
+
+        Args:
+            *dfs (DataFrame): DataFrames with identifier columns.
+            **values (list): Additional values by kind of identifier. Ex.: version=['v0']
+
+        Returns:
+            KeyEncoder: self
+        """
+        new_values = {}
+        for df in dfs:
+            for col in df.columns:
+                if col in self.domains:
+                    new_values.setdefault(self.domains[col], []).append(df[col].to_numpy(dtype=object))
+        for domain, vals in values.items():
+            new_values.setdefault(domain, []).append(np.asarray(vals, dtype=object))
+
+        for domain, arrays in new_values.items():
+            existing = self.categories.get(domain, pd.Index([], dtype=object)).to_numpy(dtype=object)
+            uniques = pd.unique(np.concatenate([existing] + arrays))
+            self.categories[domain] = pd.Index(uniques[pd.notna(uniques)], dtype=object)
+        return self
+
+    def encode(self, df, columns):
+        """Encodes identifier columns as integer codes.
+
+        Args:
+            df (DataFrame): DataFrame with identifier columns.
+            columns (list of str): Columns to be encoded.
+
+        Returns:
+            DataFrame: Integer codes of 'columns'. Missing and unknown values have code -1.
+        """
+        return pd.DataFrame(
+            {col: self.encode_values(self.domains[col], df[col]) for col in columns},
+            index=df.index,
+        )
 
+    def encode_values(self, domain, values):
+        """Encodes values of one kind of identifier.
+
+        Args:
+            domain (str): Kind of identifier, ex.: 'dataset'.
+            values (list or Series): Values to be encoded.
+
+        Returns:
+            ndarray: Integer codes. Missing and unknown values have code -1.
+        """
+        categories = self.categories.get(domain, pd.Index([], dtype=object))
+        return categories.get_indexer(pd.Index(values, dtype=object)).astype(np.int64)
+
+    def decode(self, codes, columns):
+        """Decodes integer codes to strings.
+
+        Args:
+            codes (DataFrame): Integer codes.
+            columns (list of str): Columns to be decoded.
+
+        Returns:
+            DataFrame: Strings of 'columns'. Code -1 is decoded to "".
+        """
+        result = {}
+        for col in columns:
+            categories = self.categories.get(self.domains[col], pd.Index([], dtype=object))
+            values = np.append(categories.to_numpy(dtype=object), "") # -1 -> ""
+            result[col] = values[codes[col].to_numpy()]
+        return pd.DataFrame(result, index=codes.index)
+
+    def combine(self, codes, columns):
+        """Combines the codes of several columns into a single integer key. Keys of
+        different tables are equal if the columns are of the same kinds of identifiers
+        in the same order.
+
+        Args:
+            codes (DataFrame): Integer codes.
+            columns (list of str): Columns to be combined.
+
+        Raises:
+            OverflowError: If the combined key does not fit into a 64-bit integer.
+
+        Returns:
+            ndarray: Integer keys.
+        """
+        key = np.zeros(len(codes), dtype=np.int64)
+        size = 1
+        for col in columns:
+            n = len(self.categories.get(self.domains[col], [])) + 1
+            size *= n
+            if size >= 2**63:
+                raise OverflowError(f"Too many distinct values to combine columns {columns}.")
+            key = key * n + (codes[col].to_numpy(dtype=np.int64) + 1)
+        return key
+
+
+class GenerationsGraph:
+    """Directed graph of the input-output relations in SOEP Dokumentation generations.csv.
+    Variables are stored as integer-coded nodes, relations as edges in compressed sparse
+    row format. All generations downstream of a variable are found by breadth-first search,
+    which also terminates for cyclic generations.
+    """
 
-def apply_filter(data, output_columns=None, filter_column='', filter=None):
-    if (output_columns==None) | (filter_column=='') | (filter==None):
+    def __init__(self, generations, merge_on_version=True, encoder=None):
+        """Creates a GenerationsGraph from generations.csv.
+
+        Args:
+            generations (DataFrame): SOEP Dokumentation generations.csv.
+            merge_on_version (bool, optional): If True, nodes are identified by
+                version, dataset and variable. Otherwise, nodes are identified by
+                dataset and variable only. Defaults to True.
+            encoder (KeyEncoder, optional): Encoder that has been fitted on generations.
+                If None, a new encoder is fitted. Defaults to None.
+        """
+
+        self.keys_in = GENERATIONS_KEYS_IN.copy()
+        self.keys_out = GENERATIONS_KEYS_OUT.copy()
+        if merge_on_version==True:
+            self.keys_in = ['input_version'] + self.keys_in
+            self.keys_out = ['output_version'] + self.keys_out
+
+        if encoder is None:
+            encoder = KeyEncoder().fit(generations[self.keys_in + self.keys_out])
+        self.encoder = encoder
+
+        # Input and output variables share one set of node codes
+        codes = pd.concat(
+            [
+                encoder.encode(generations, self.keys_in).set_axis(self.keys_out, axis=1),
+                encoder.encode(generations, self.keys_out),
+            ],
+            ignore_index=True,
+        )
+        self.node_keys, first, inverse = np.unique(
+            encoder.combine(codes, self.keys_out), return_index=True, return_inverse=True
+        )
+        self.node_codes = codes.iloc[first].reset_index(drop=True)
+        inverse = inverse.reshape(-1).astype(np.int64)
+        n = max(len(self.node_keys), 1)
+
+        # Unique edges sorted by source
+        source = inverse[:len(generations)]
+        target = inverse[len(generations):]
+        edges = np.unique(source * n + target)
+        source, self.indices = np.divmod(edges, n)
+        self.indptr = np.concatenate(
+            [[0], np.cumsum(np.bincount(source, minlength=len(self.node_keys)))]
+        ).astype(np.int64)
+
+    def __len__(self):
+        return len(self.node_keys)
+
+    @property
+    def nodes(self):
+        """DataFrame: Decoded variables of all nodes."""
+        return self.encoder.decode(self.node_codes, self.keys_out)
+
+    def encode(self, df, columns=None):
+        """Returns the node codes of the variables in a DataFrame.
+
+        Args:
+            df (DataFrame): DataFrame with output keys of generations.csv.
+            columns (list of str, optional): Columns that identify a variable. Must be
+                in the order of self.keys_out. Defaults to self.keys_out.
+
+        Returns:
+            ndarray: Integer codes. Variables that are not in the graph have code -1.
+        """
+        if columns is None:
+            columns = self.keys_out
+        codes = self.encoder.encode(df[columns].set_axis(self.keys_out, axis=1), self.keys_out)
+        return self.encode_codes(codes)
+
+    def encode_codes(self, codes):
+        """Returns the node codes of variables given by the integer codes of self.encoder.
+
+        Args:
+            codes (DataFrame): Integer codes of columns self.keys_out.
+
+        Returns:
+            ndarray: Integer codes. Variables that are not in the graph have code -1.
+        """
+        keys = self.encoder.combine(codes, self.keys_out)
+        positions = np.searchsorted(self.node_keys, keys)
+        positions = np.minimum(positions, max(len(self.node_keys) - 1, 0))
+        found = (self.node_keys[positions]==keys) if len(self.node_keys) > 0 else np.zeros(len(keys), dtype=bool)
+        return np.where(found, positions, -1).astype(np.int64)
+
+    def successors(self, nodes):
+        """Returns the direct successors of an array of nodes.
+
+        Args:
+            nodes (ndarray): Integer codes of nodes.
+
+        Returns:
+            (ndarray, ndarray): Position of the predecessor in 'nodes' and code of the successor.
+        """
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return np.repeat(np.arange(len(nodes)), counts), self.indices[offsets]
+
+    def descendants(self, groups, nodes):
+        """Finds all nodes that can be reached from the given start nodes. Start nodes
+        are assigned to groups, and the search is run for all groups at once.
+
+        Args:
+            groups (ndarray): Integer group of each start node.
+            nodes (ndarray): Integer codes of start nodes. Nodes with code -1 are ignored.
+
+        Returns:
+            (ndarray, ndarray): Group and code of every reached node, including start nodes.
+        """
+        n = max(len(self), 1)
+        groups = np.asarray(groups, dtype=np.int64)
+        nodes = np.asarray(nodes, dtype=np.int64)
+        mask = nodes >= 0
+        reached = np.unique(groups[mask] * n + nodes[mask])
+        frontier = reached
+        while frontier.size > 0:
+            frontier_groups, frontier_nodes = np.divmod(frontier, n)
+            positions, targets = self.successors(frontier_nodes)
+            keys = np.unique(frontier_groups[positions] * n + targets)
+            frontier = np.setdiff1d(keys, reached, assume_unique=True)
+            reached = np.union1d(reached, frontier)
+        return np.divmod(reached, n)
+
+    def find_cycles(self):
+        """Finds nodes that cannot be sorted topologically (Kahn's algorithm).
+
+        Returns:
+            DataFrame: Variables that are part of a cycle or downstream of a cycle.
+        """
+        indegree = np.bincount(self.indices, minlength=len(self))
+        frontier = np.flatnonzero(indegree==0)
+        while frontier.size > 0:
+            _, targets = self.successors(frontier)
+            np.subtract.at(indegree, targets, 1)
+            targets = np.unique(targets)
+            frontier = targets[indegree[targets]==0]
+        return self.encoder.decode(self.node_codes[indegree > 0], self.keys_out)
+
+
+def apply_filter(data, output_columns=None, filter_column='', filter=None, empty=""):
+    if (output_columns is None) | (filter_column=='') | (filter is None):
         return data
-    for i, clist in enumerate(output_columns):
-        datasetcolumn = filter_column + '_' + str(i)
-        data.loc[~data[datasetcolumn].isin(filter), clist] = "" # Keep only items in filter
+    data.loc[~data[filter_column].isin(filter), output_columns] = empty # Keep only items in filter
     return data
 
 
-def remove_column_from_output(data, column='', end=0):
-    if (column=='') | (end==0):
+def remove_column_from_output(data, column='', empty=""):
+    if column=='':
         return data
-    cols = []
-    for i in range(end):
-        cols.append(column + '_' + str(i))
-    data.loc[:, cols] = ""
+    data[column] = empty
     return data
 
-def concat_str_cols_twice(series, col_lists):
-  
-    result = []
-    for columns in col_lists:
-        string = concat_str_cols(series, columns, sep='/')
-        if string != "":
-            result.append(string)
-    return ','.join(result)
-
 
-def concat_str_cols(series, columns, sep='/'):
-    """Concatenates content of string columns to single string
+def concat_str_cols(df, columns, sep='/'):
+    """Concatenates content of string columns to single string column. Empty
+    and missing cells are skipped.
 
     Parameters
     ----------
-    series : pandas Series
+    df : DataFrame
     columns : list of str
-        Column names in Series
+        Column names in DataFrame
     sep : str, optional
         Concatenate columns with seperator 'sep', by default '/'
 
     Returns
     -------
-    str
+    Series
        Concatenated content of columns
     """
-   
-    values = [
-        str(series[col])
-        for col in columns
-        if ((series[col]!="") & (isinstance(series[col], str)))
-    ]
-    if len(values)>0:
-        return sep.join(values)
-    return ""
+
+    result = np.full(len(df), "", dtype=object)
+    for col in columns:
+        values = df[col].fillna("").to_numpy(dtype=object)
+        both = (result!="") & (values!="")
+        result = np.where(both, result + sep + values, result + values)
+    return pd.Series(result, index=df.index, dtype=object)
+
+
+def join_str_groups(df, by, column, sep=','):
+    """Joins the strings of a column within groups. Strings are concatenated
+    by a single numpy reduction over the sorted groups.
+
+    Parameters
+    ----------
+    df : DataFrame
+    by : list of str
+        Column names that define the groups
+    column : str
+        Name of string column
+    sep : str, optional
+        Join strings with seperator 'sep', by default ','
+
+    Returns
+    -------
+    DataFrame
+       DataFrame with columns 'by' and 'column', one row per group in order of appearance
+    """
+
+    if len(df)==0:
+        return df[by + [column]].iloc[:0]
+
+    codes = df.groupby(by, sort=False).ngroup().to_numpy()
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:]!=codes[:-1]])
+    strings = df[column].to_numpy(dtype=object)[order] + sep
+    joined = np.add.reduceat(strings, starts)
+
+    result = df[by].iloc[order[starts]].reset_index(drop=True)
+    result[column] = pd.Series(joined, dtype=object).str[:-len(sep)] if sep else joined
+    return result
 
 
 def get_similar_questions(
@@ -304,11 +710,17 @@ def get_similar_questions(
     questionnaire2,
     compare_columns = ['text_de'],
     copy_columns = ['question', 'item'],
-    algorithm='levenshtein'
+    algorithm='levenshtein',
+    top_k=1,
+    threshold=None,
+    block_columns=None,
+    candidates=50,
+    n_jobs=1,
     ):
 
-    """For each question in questionnaire1, find the most similar question
-    in questionnaire2 
+    """For each question in questionnaire1, find the most similar questions
+    in questionnaire2. Candidates are preselected with an index of character n-grams
+    and then scored by their normalized Levenshtein distance.
 
     Parameters
     ----------
@@ -316,46 +728,82 @@ def get_similar_questions(
     questionnaire2 : DataFrame
     compare_columns : list of str
         List of column names of questionnaire1 and questionnaire2 that are compared to each other.
+    copy_columns : list of str
+        List of column names of questionnaire2 that are added to the result with suffix '_2'.
     algorithm : str, optional
         Algorithm to calculate similarity between questions.
+    top_k : int, optional
+        Number of most similar questions per question, by default 1. If top_k > 1, 
+        the result has one row per match and a column 'rank'.
+    threshold : float, optional
+        Maximum normalized distance between 0 and 1 of a match, by default None.
+    block_columns : list of str, optional
+        Only questions with equal values in these columns are compared.
+        Ex.: block_columns=['scale'], by default None.
+    candidates : int, optional
+        Number of candidates per question that are scored. If None, every pair 
+        of questions is scored, by default 50.
+    n_jobs : int, optional
+        Number of processes used for scoring, by default 1.
+
     Returns
     -------
     DataFrame
 
     """
     
-    if algorithm=='levenshtein':
-        import Levenshtein
-    else:
+    if algorithm!='levenshtein':
         raise Exception("Supports only algorithm 'levenshtein'")
 
+    if block_columns is None:
+        block_columns = []
+
     # Select only items that contain data
-    mask1 = questionnaire1.scale.isin(DATA_SCALES)
-    mask2 = questionnaire2.scale.isin(DATA_SCALES)
-
-    texts1 = _concat_columns_to_array(questionnaire1.loc[mask1, compare_columns])
-    texts2 = _concat_columns_to_array(questionnaire2.loc[mask2, compare_columns])
-    indices2 = questionnaire2[mask2].index
-
-    result = np.full((sum(mask1), 2), np.nan)
-   
-    for i, s1 in enumerate(texts1):
-        for j, s2 in zip(indices2, texts2):
-            newdist =  Levenshtein.distance(s1, s2)/(max(len(s1), len(s2)))
-            if np.isnan(result[i][1]):
-                result[i][0] = j
-                result[i][1] = newdist
-            elif newdist<result[i][1]:
-                result[i][0] = j
-                result[i][1] = newdist
-    
+    mask1 = questionnaire1.scale.isin(DATA_SCALES).to_numpy()
+    mask2 = questionnaire2.scale.isin(DATA_SCALES).to_numpy()
+
+    texts1 = np.full(len(questionnaire1), '', dtype=object)
+    texts2 = np.full(len(questionnaire2), '', dtype=object)
+    texts1[mask1] = _concat_columns_to_array(questionnaire1.loc[mask1, compare_columns])
+    texts2[mask2] = _concat_columns_to_array(questionnaire2.loc[mask2, compare_columns])
+    blocks1 = _block_keys(questionnaire1, block_columns)
+    blocks2 = _block_keys(questionnaire2, block_columns)
+
+    # Match each block of questionnaire1 against the same block of questionnaire2
+    rows, indices2, distances = [], [], []
+    for block in pd.unique(blocks1[mask1]):
+        positions1 = np.flatnonzero(mask1 & (blocks1==block))
+        positions2 = np.flatnonzero(mask2 & (blocks2==block))
+        if len(positions2)==0:
+            continue
+        index = NGramIndex(texts2[positions2])
+        matches = parallel_best_matches(
+            index,
+            texts1[positions1],
+            top_k=top_k,
+            threshold=threshold,
+            candidates=candidates,
+            n_jobs=n_jobs,
+        )
+        for i, match in zip(positions1, matches):
+            for j, distance in match:
+                rows.append(i)
+                indices2.append(questionnaire2.index[positions2[j]])
+                distances.append(distance)
+
+    result = pd.DataFrame({'row': rows, 'index_2': indices2, 'distance': distances})
+    result['rank'] = result.groupby('row').cumcount() + 1
+    if top_k==1:
+        result = result.drop(columns=['rank'])
+
     # Merge result to questionnaire1
-    questionnaire1.loc[mask1, ['index_2', 'distance']] = result
+    questionnaire1 = questionnaire1.assign(row=np.arange(len(questionnaire1)))
+    questionnaire1 = pd.merge(questionnaire1, result, how='left', on='row')
     questionnaire1 = pd.merge(
-        questionnaire1,
+        questionnaire1.drop(columns=['row']),
         questionnaire2[copy_columns + compare_columns],
         left_on='index_2',
-        right_on=questionnaire2.index,
+        right_index=True,
         how = 'left',
         suffixes = ['', '_2'],
     )
@@ -363,8 +811,22 @@ def get_similar_questions(
     return questionnaire1
 
 
-def _concat_columns_to_array(df):
-    return [' '.join([val for val in col if val]) for col in df.values]
+def _block_keys(df, columns):
+    if len(columns)==0:
+        return np.zeros(len(df), dtype=object)
+    return np.array(_concat_columns_to_array(df[columns].astype(str)), dtype=object)
+
+
+def _known(codes):
+    return codes[codes>=0]
+
+
+def _check_columns(df, columns, csvtype):
+    try:
+        assert(_columns_in_df(df, columns))
+    except AssertionError:
+        print(f"{csvtype} does not have the required columns '{columns}'")
+        raise
 
 
 def _columns_in_df(df, columns):
@@ -0,0 +1,307 @@
+import pickle
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .const import DATA_SCALES
+from .utils import parallel_map
+
+
+class NGramIndex:
+    """Inverted index of the character n-grams of a list of texts. The index
+    generates candidates of similar texts by counting shared n-grams, which is
+    much cheaper than computing an edit distance for every pair of texts.
+    """
+
+    def __init__(self, texts, n=3):
+        """Builds the index.
+
+        Args:
+            texts (list of str): Texts to be indexed.
+            n (int, optional): Length of n-grams. Defaults to 3.
+        """
+        self.texts = list(texts)
+        self.n = n
+        self.vocabulary = {} # n-gram -> id
+
+        grams, docs, sizes = [], [], []
+        for doc, text in enumerate(self.texts):
+            ids = self._gram_ids(text, add=True)
+            grams.extend(ids)
+            docs.extend([doc] * len(ids))
+            sizes.append(len(ids))
+
+        # Postings sorted by n-gram
+        grams = np.asarray(grams, dtype=np.int64)
+        order = np.argsort(grams, kind='stable')
+        self.docs = np.asarray(docs, dtype=np.int64)[order]
+        self.indptr = np.concatenate(
+            [[0], np.cumsum(np.bincount(grams, minlength=len(self.vocabulary)))]
+        ).astype(np.int64)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _gram_ids(self, text, add=False):
+        """Returns the ids of the distinct n-grams of a text. Unknown n-grams are
+        added to the vocabulary if add is True, and ignored otherwise."""
+        grams = _grams(text, self.n)
+        if add:
+            return [self.vocabulary.setdefault(g, len(self.vocabulary)) for g in grams]
+        return [self.vocabulary[g] for g in grams if g in self.vocabulary]
+
+    def scores(self, text):
+        """Computes the Dice coefficient of n-grams between a text and all indexed texts.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            ndarray: Score between 0 and 1 for every indexed text.
+        """
+        grams = _grams(text, self.n)
+        ids = [self.vocabulary[g] for g in grams if g in self.vocabulary]
+        if (len(ids)==0) | (len(self)==0):
+            return np.zeros(len(self))
+        postings = np.concatenate([self.docs[self.indptr[i]:self.indptr[i+1]] for i in ids])
+        overlap = np.bincount(postings, minlength=len(self))
+        return 2 * overlap / (len(grams) + self.sizes)
+
+    def candidates(self, text, k):
+        """Returns the positions of the k indexed texts with the highest scores.
+
+        Args:
+            text (str): Query text.
+            k (int or None): Number of candidates. If None, all texts are returned.
+
+        Returns:
+            ndarray: Positions of candidates in self.texts.
+        """
+        if (k is None) or (k >= len(self)):
+            return np.arange(len(self))
+        scores = self.scores(text)
+        return np.sort(np.argpartition(-scores, k - 1)[:k])
+
+
+def _grams(text, n):
+    """Returns the distinct character n-grams of a lower-cased, space-padded text."""
+    text = " " + text.lower() + " "
+    return {text[i:i+n] for i in range(max(len(text) - n + 1, 1))}
+
+
+def best_matches(index, texts, top_k=1, threshold=None, candidates=50):
+    """Finds the most similar indexed texts for a list of texts. Candidates are
+    generated by the n-gram index and scored by their normalized Levenshtein distance.
+
+    Args:
+        index (NGramIndex): Index of texts to be searched.
+        texts (list of str): Query texts.
+        top_k (int, optional): Number of matches per query text. Defaults to 1.
+        threshold (float, optional): Maximum normalized distance of a match. Defaults to None.
+        candidates (int, optional): Number of candidates scored per query text. If None,
+            all indexed texts are scored. Defaults to 50.
+
+    Returns:
+        list of list of (int, float): For every query text, positions of matches in
+        index.texts and their distances, sorted by distance.
+    """
+    import Levenshtein
+
+    result = []
+    for text in texts:
+        matches = []
+        for j in index.candidates(text, candidates):
+            other = index.texts[j]
+            distance = Levenshtein.distance(text, other) / max(len(text), len(other), 1)
+            if (threshold is None) or (distance <= threshold):
+                matches.append((distance, int(j)))
+        matches.sort()
+        result.append([(j, distance) for distance, j in matches[:top_k]])
+    return result
+
+
+def _best_matches_chunk(args):
+    return best_matches(*args)
+
+
+def parallel_best_matches(index, texts, top_k=1, threshold=None, candidates=50, n_jobs=1, chunk_size=500):
+    """Runs best_matches() on chunks of texts in a pool of processes.
+
+    Args:
+        n_jobs (int, optional): Number of processes. If 1, no pool is used. Defaults to 1.
+        chunk_size (int, optional): Number of query texts per chunk. Defaults to 500.
+
+    Returns:
+        list of list of (int, float): See best_matches().
+    """
+    texts = list(texts)
+    if (n_jobs==1) | (len(texts) <= chunk_size):
+        return best_matches(index, texts, top_k=top_k, threshold=threshold, candidates=candidates)
+
+    chunks = [
+        (index, texts[i:i+chunk_size], top_k, threshold, candidates)
+        for i in range(0, len(texts), chunk_size)
+    ]
+    result = []
+    for chunk_result in parallel_map(_best_matches_chunk, chunks, n_jobs=n_jobs):
+        result.extend(chunk_result)
+    return result
+
+
+def match_questionnaire_chain(
+        questionnaires,
+        compare_columns=['text_de'],
+        threshold=0.3,
+        candidates=50,
+        n_jobs=1,
+        cache_dir=None,
+    ):
+    """Tracks items across a sequence of questionnaires, ex.: pe2020 -> pe2021 -> pe2022.
+    Each questionnaire is matched against its predecessor, and matched items are chained
+    into stable ids. An item keeps the id of its most similar item in the predecessor
+    questionnaire; items without a match within 'threshold' start a new chain.
+
+    Matches of each pair of questionnaires are cached in 'cache_dir' by the content of both
+    questionnaires, so that adding a new questionnaire requires only one new match.
+
+    Args:
+        questionnaires (dict of DataFrame): SOEP Dokumentation questions.csv in chronological
+            order. Ex.: {'soep-core-2020-pe': df1, 'soep-core-2021-pe': df2}
+        compare_columns (list of str, optional): Columns that are compared. Defaults to ['text_de'].
+        threshold (float, optional): Maximum normalized Levenshtein distance of matched items.
+            Defaults to 0.3.
+        candidates (int, optional): Number of candidates per item that are scored. Defaults to 50.
+        n_jobs (int, optional): Number of processes that match pairs of questionnaires.
+            Defaults to 1.
+        cache_dir (Path or str, optional): Directory for cached matches. Defaults to None.
+
+    Returns:
+        DataFrame: One row per data item with columns 'questionnaire' (key in questionnaires),
+        'index' (index in questionnaire), 'question', 'item', 'chain_id', and 'distance' to the
+        matched item in the predecessor questionnaire.
+    """
+
+    names = list(questionnaires.keys())
+    items = {name: _data_items(questionnaires[name], compare_columns) for name in names}
+    options = (tuple(compare_columns), threshold, candidates)
+    fingerprints = {name: _items_fingerprint(items[name], options) for name in names}
+
+    # Match adjacent questionnaires, cached pairs are loaded
+    pairs = list(zip(names[:-1], names[1:]))
+    matches = {}
+    todo = []
+    for old, new in pairs:
+        cached = _load_cached_match(cache_dir, fingerprints[old], fingerprints[new])
+        if cached is not None:
+            matches[(old, new)] = cached
+        else:
+            todo.append((old, new))
+
+    args = [
+        (list(items[old]['text']), list(items[new]['text']), threshold, candidates)
+        for old, new in todo
+    ]
+    results = parallel_map(_match_pair_args, args, n_jobs=n_jobs)
+
+    for (old, new), result in zip(todo, results):
+        matches[(old, new)] = result
+        _save_cached_match(cache_dir, fingerprints[old], fingerprints[new], result)
+
+    # Chain matches into ids
+    frames = []
+    previous_ids = None
+    for k, name in enumerate(names):
+        df = items[name]
+        ids = np.array(
+            [f"{name};{q};{i}" for q, i in zip(df['question'], df['item'])], dtype=object
+        )
+        distance = np.full(len(df), np.nan)
+        if k > 0:
+            positions_old, positions_new, distances = matches[(names[k-1], name)]
+            ids[positions_new] = previous_ids[positions_old]
+            distance[positions_new] = distances
+        frames.append(df[['index', 'question', 'item']].assign(
+            questionnaire=name, chain_id=ids, distance=distance
+        ))
+        previous_ids = ids
+
+    if len(frames)==0:
+        return pd.DataFrame(columns=['questionnaire', 'index', 'question', 'item', 'chain_id', 'distance'])
+    return pd.concat(frames, ignore_index=True)[
+        ['questionnaire', 'index', 'question', 'item', 'chain_id', 'distance']
+    ]
+
+
+def _data_items(questionnaire, compare_columns):
+    """Returns the data items of a questionnaire with their compared text."""
+    mask = questionnaire['scale'].isin(DATA_SCALES)
+    df = questionnaire.loc[mask, ['question', 'item']].copy()
+    df['index'] = questionnaire.index[mask]
+    df['text'] = _concat_columns_to_array(questionnaire.loc[mask, compare_columns])
+    return df.reset_index(drop=True)
+
+
+def _concat_columns_to_array(df):
+    return [' '.join([val for val in col if val]) for col in df.values]
+
+
+def _items_fingerprint(items, options):
+    """Fingerprint of the data items of a questionnaire and the matching options."""
+    import hashlib
+    digest = hashlib.sha1(repr(options).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(items[['question', 'item', 'text']], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _match_pair(texts_old, texts_new, threshold, candidates):
+    """Matches each item of the newer questionnaire to at most one item of the older
+    questionnaire. If several items match the same old item, the closest one is kept.
+
+    Returns:
+        (ndarray, ndarray, ndarray): Positions of old items, positions of new items, and distances.
+    """
+    index = NGramIndex(texts_old)
+    matches = best_matches(index, texts_new, top_k=1, threshold=threshold, candidates=candidates)
+    pairs = sorted(
+        (match[0][1], j, match[0][0]) for j, match in enumerate(matches) if len(match) > 0
+    ) # (distance, new, old)
+
+    positions_old, positions_new, distances = [], [], []
+    used = set()
+    for distance, new, old in pairs:
+        if old not in used:
+            used.add(old)
+            positions_old.append(old)
+            positions_new.append(new)
+            distances.append(distance)
+    return (
+        np.asarray(positions_old, dtype=np.int64),
+        np.asarray(positions_new, dtype=np.int64),
+        np.asarray(distances, dtype=float),
+    )
+
+
+def _match_pair_args(args):
+    return _match_pair(*args)
+
+
+def _cache_file(cache_dir, fingerprint_old, fingerprint_new):
+    return Path(cache_dir) / f"match_{fingerprint_old[:16]}_{fingerprint_new[:16]}.pickle"
+
+
+def _load_cached_match(cache_dir, fingerprint_old, fingerprint_new):
+    if cache_dir is None:
+        return None
+    path = _cache_file(cache_dir, fingerprint_old, fingerprint_new)
+    if not path.exists():
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _save_cached_match(cache_dir, fingerprint_old, fingerprint_new, result):
+    if cache_dir is None:
+        return None
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    with open(_cache_file(cache_dir, fingerprint_old, fingerprint_new), 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,145 @@
+import json
+import pickle
+from pathlib import Path
+import pandas as pd
+from .const import VALID_CSV_TYPES
+from .reader import read_csv
+from .utils import parallel_map
+
+# Format of snapshots. Increase if the stored content changes.
+SNAPSHOT_FORMAT = 1
+
+
+def export_snapshot(root, snapshot_dir, parse_filters=True, n_jobs=1):
+    """Exports all SOEP-style CSV files of a metadata repository into a columnar snapshot:
+    one Feather file per csvtype and a manifest. Files are found recursively in 'root' by
+    their name, ex.: 'datasets/pl/v39/variables.csv'. Rows of a CSV file are stored next to
+    each other in their original order and keep the relative path of the file in column
+    'source'. Parsed filters are stored as serialized objects in column
+    'filter_parsed'. Requires the package 'pyarrow'.
+
+    Args:
+        root (Path or str): Root directory of the metadata repository.
+        snapshot_dir (Path or str): Directory of the snapshot.
+        parse_filters (bool, optional): If True, filters of questions.csv are parsed and
+            stored. Defaults to True.
+        n_jobs (int, optional): Number of processes that read CSV files. Defaults to 1.
+
+    Returns:
+        dict: The manifest of the snapshot.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    root = Path(root)
+    files = sorted(f for f in root.rglob('*.csv') if f.stem in VALID_CSV_TYPES)
+    args = [(f, f.stem, parse_filters & (f.stem=='questions')) for f in files]
+
+    frames = parallel_map(_read_one, args, n_jobs=n_jobs)
+
+    tables = {}
+    for f, df in zip(files, frames):
+        tables.setdefault(f.stem, []).append(df.assign(source=f.relative_to(root).as_posix()))
+
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {'format': SNAPSHOT_FORMAT, 'root': str(root.resolve()), 'tables': {}}
+    for csvtype, dfs in sorted(tables.items()):
+        df = pd.concat(dfs, ignore_index=True)
+        strings = [col for col in df.columns if col!='filter_parsed']
+        df[strings] = df[strings].fillna('')
+
+        # Serialize parsed filters
+        if 'filter_parsed' in df.columns:
+            df['filter_parsed'] = [
+                None if f is None else pickle.dumps(f, protocol=pickle.HIGHEST_PROTOCOL)
+                for f in df['filter_parsed']
+            ]
+            schema = pa.schema(
+                [(col, pa.binary() if col=='filter_parsed' else pa.string()) for col in df.columns]
+            )
+        else:
+            schema = pa.schema([(col, pa.string()) for col in df.columns])
+
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        feather.write_feather(table, snapshot_dir / f"{csvtype}.feather", compression='uncompressed')
+        manifest['tables'][csvtype] = {
+            'file': f"{csvtype}.feather",
+            'rows': len(df),
+            'sources': sorted(df['source'].unique().tolist()),
+        }
+
+    with open(snapshot_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load_snapshot(snapshot_dir, csvtypes=None, parse_filters=False, **filters):
+    """Loads tables of a snapshot of export_snapshot(). Feather files are memory-mapped,
+    and rows are selected before they are converted to DataFrames. Requires the package
+    'pyarrow'.
+
+    Example:
+        tables = load_snapshot("snapshot", csvtypes=['variables'], dataset='pl', version=['v38', 'v39'])
+        variables = tables['variables']
+
+    Args:
+        snapshot_dir (Path or str): Directory of the snapshot.
+        csvtypes (list of str, optional): Tables to be loaded. Defaults to None, all tables.
+        parse_filters (bool, optional): If True, parsed filters are restored in column
+            'filter_parsed'. Otherwise, the column is not loaded. Defaults to False.
+        **filters: Selects rows by the values of columns, ex.: study='soep-core' or
+            version=['v38', 'v39']. Tables without a column are not filtered by it.
+
+    Returns:
+        dict: Dictionary of form {csvtype: DataFrame}.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+
+    snapshot_dir = Path(snapshot_dir)
+    with open(snapshot_dir / 'manifest.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format')!=SNAPSHOT_FORMAT:
+        print(f"Snapshot has format {manifest.get('format')}, expected {SNAPSHOT_FORMAT}. Export the snapshot again.")
+        raise ValueError
+
+    if csvtypes is None:
+        csvtypes = list(manifest['tables'].keys())
+
+    result = {}
+    for csvtype in csvtypes:
+        if csvtype not in manifest['tables']:
+            print(f"Table {csvtype} not in snapshot {snapshot_dir}.")
+            raise KeyError(csvtype)
+        columns = None
+        if not parse_filters:
+            schema = pa.ipc.open_file(pa.memory_map(str(snapshot_dir / manifest['tables'][csvtype]['file']))).schema
+            columns = [name for name in schema.names if name!='filter_parsed']
+        table = feather.read_table(
+            snapshot_dir / manifest['tables'][csvtype]['file'], columns=columns, memory_map=True
+        )
+
+        # Select rows
+        mask = None
+        for col, values in filters.items():
+            if col not in table.column_names:
+                continue
+            values = [values] if isinstance(values, str) else list(values)
+            condition = pc.is_in(table[col], value_set=pa.array(values, type=pa.string()))
+            mask = condition if mask is None else pc.and_(mask, condition)
+        if mask is not None:
+            table = table.filter(mask)
+
+        df = table.to_pandas()
+        if 'filter_parsed' in df.columns:
+            df['filter_parsed'] = [None if f is None else pickle.loads(f) for f in df['filter_parsed']]
+        df.csvtype = csvtype
+        result[csvtype] = df
+    return result
+
+
+def _read_one(args):
+    csvfile, csvtype, parse_filters = args
+    return read_csv(csvfile, csvtype=csvtype, parse_filters=parse_filters)
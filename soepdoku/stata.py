@@ -1,5 +1,7 @@
 from soepdoku.const import CSV_TYPE_TO_COLS, TYPES_PANDAS_TO_SOEP
 from soepdoku import write_csv
+from soepdoku.utils import parallel_map, stat_fingerprint
+from pathlib import Path
 import pandas as pd
 from pandas.io.stata import StataReader
 
@@ -56,8 +58,7 @@ def stata_to_csv(
         variable_labels = reader.variable_labels()# Ex: {'x1': '', 'x2': '', 'x3': 'Score', 'x4': 'Attitude'}
         value_labels = reader.value_labels() # Ex: {'x3': {1: '[1] score 1', 2: '[2] score 2', 3: '[3] score 3'}, 'x1_lbl': {1: '[1] Value1', 2: '[2] Value2'}}
         value_labels_list = reader._lbllist  # Contains label name assigned to each variable. Ex: ['x1_lbl', '', 'x3', 'x1_lbl']
-        var_to_value_labels = {variable: value_labels.get(lblname, {}) for variable, lblname in zip(list(variable_labels.keys()), value_labels_list)}
-        var_to_value_labels = {variable: dict(sorted(values.items())) for variable, values in var_to_value_labels.items()} # Sort by value
+        datatypes = _header_datatypes(reader) # Ex: {'x1': 'int8', 'x2': 'float64', 'x3': 'object'}
     
     # If no labels retrieved, don't write to csv -> to do: discuss whether writing empty csv is preferable
     if not bool(variable_labels):
@@ -72,7 +73,7 @@ def stata_to_csv(
             return None
         else:
             df = gen_dataframe_from_dict(variable_labels, columns_in_dict=['variable', label_var])
-            df = add_datatypes(df, data)
+            df = add_datatypes(df, datatypes)
             df = add_constant_columns(df, columns=constant_columns, csvtype='variables')
             write_csv(df, output_dir+'/variables.csv', csvtype='variables', sort_columns=True)
       
@@ -82,7 +83,12 @@ def stata_to_csv(
             return None
         
         else:
-            df = gen_dataframe_from_dict(var_to_value_labels, columns_in_dict=['variable', 'value', label_var])
+            df = gen_value_labels_dataframe(
+                list(variable_labels.keys()),
+                value_labels_list,
+                value_labels,
+                columns=['variable', 'value', label_var],
+            )
             df = add_constant_columns(df, columns=constant_columns, csvtype='variable_categories')
             write_csv(df, output_dir+'/variable_categories.csv', csvtype='variable_categories', sort_columns=True)
 
@@ -115,6 +121,50 @@ def gen_dataframe_from_dict(dictionary, columns_in_dict):
     return data
 
 
+def gen_value_labels_dataframe(variables, label_names, value_labels, columns):
+    """Generates a pandas DataFrame of value labels with one row per variable and value.
+    Value-label sets are deduplicated by content and sorted once, even if they are
+    shared by many variables. Rows are then expanded by merging the table of label
+    sets with the variables.
+
+    Args:
+        variables (list of str): Variable names. Ex.: ['x1', 'x2', 'x3']
+        label_names (list of str): Name of the value-label set of each variable.
+            Ex.: ['yesno', '', 'yesno']
+        value_labels (dict): Dictionary of value-label sets. Ex.: {'yesno': {1: 'Ja', 2: 'Nein'}}
+        columns (list of str): Names of the variable, value, and label columns.
+
+    Returns:
+        DataFrame: Value labels sorted by variable and value.
+    """
+
+    # Deduplicate label sets by content, sort each set once
+    set_ids = {}
+    name_to_set = {}
+    sets, values, labels = [], [], []
+    for name, labelset in value_labels.items():
+        content = tuple(sorted(labelset.items()))
+        if content not in set_ids:
+            set_ids[content] = len(set_ids)
+            sets.extend([set_ids[content]] * len(content))
+            values.extend(str(value) for value, _ in content)
+            labels.extend(str(label) for _, label in content)
+        name_to_set[name] = set_ids[content]
+
+    table = pd.DataFrame({'set': sets, columns[1]: values, columns[2]: labels})
+    table['rank'] = table.groupby('set').cumcount()
+
+    # Expand label sets to variables
+    mapping = pd.DataFrame({
+        columns[0]: list(variables),
+        'set': [name_to_set.get(name, -1) for name in label_names],
+    })
+    mapping['order'] = mapping.index
+    df = mapping.merge(table, how='inner', on='set')
+    df = df.sort_values(['order', 'rank'], kind='stable').reset_index(drop=True)
+    return df[columns]
+
+
 def unpack_dict(value, parent=None, index=0, result=None):
     """Recursively unpacks a nested dictionary and returns a 'flat' dictionary of form
     {0: [v1, v2, v3], 1: [v4, v5, v6], 2: [v7, v8, v9]}
@@ -144,19 +194,21 @@ def unpack_dict(value, parent=None, index=0, result=None):
     
     # Recusive step, assumes that value is dictionary
     for k, v in value.items():
-        parent += [str(k)]
+        parent.append(str(k))
         result, index = unpack_dict(v, parent=parent, index=index, result=result)
-        parent.remove(str(k))
+        parent.pop()
     
     return result, index
     
-def add_datatypes(df, statadta):
+def add_datatypes(df, datatypes):
     """Adds the 'type' column to a pandas DataFrame that contains a SOEP-style
-    table of variables. The 'type' of each variable is retrieved from a Stata dta file.
+    table of variables. The 'type' of each variable is retrieved from the header
+    of a Stata dta file; observations are not read.
   
     Args:
         df (DataFrame):
-        statadta (Stata dta): A Stata dta file
+        datatypes (dict or Stata dta): Dictionary of variable name to pandas data type,
+            ex.: {'x1': 'int8'}, or a Stata dta file.
 
     Returns:
         df (DataFrame): Updated dataframe
@@ -166,13 +218,40 @@ def add_datatypes(df, statadta):
     if df is None:
         return None
 
-    df_temp = pd.read_stata(statadta, convert_categoricals=False)
-    dtypes = df_temp.dtypes
-    dtypes.name = 'type'
+    if not isinstance(datatypes, dict):
+        with StataReader(datatypes) as reader:
+            datatypes = _header_datatypes(reader)
+
+    dtypes = pd.Series(datatypes, name='type', dtype=object)
     dtypes = dtypes.replace(TYPES_PANDAS_TO_SOEP)
     df = df.merge(dtypes, left_on='variable', right_index=True)
     return df
 
+
+def _header_datatypes(reader):
+    """Reads the data types of all variables from the header of a Stata dta file.
+
+    Args:
+        reader (StataReader): An open StataReader.
+
+    Returns:
+        dict: Dictionary of variable name to pandas data type. Ex.: {'x1': 'int8', 'x2': 'object'}
+    """
+    reader.variable_labels() # Reads header
+    return {
+        variable: 'object' if _is_string_type(typ, dtype) else dtype.name
+        for variable, typ, dtype in zip(reader._varlist, reader._typlist, reader._dtyplist)
+    }
+
+
+def _is_string_type(typ, dtype):
+    """Tests if a variable of a dta header is a string. Fixed-width strings are stored as
+    their width, and as bytes dtypes in formats before 117. strLs have type code 32768,
+    which pandas reads as 'Q' with dtype uint8."""
+    if isinstance(typ, int) or (typ in ('Q', 32768)):
+        return True
+    return (not hasattr(dtype, 'kind')) or (dtype.kind in ('S', 'U', 'O'))
+
 def add_constant_columns(df, columns, csvtype='variables'):
     """Adds columns to a dataframe with constant values across rows.
 
@@ -192,4 +271,453 @@ def add_constant_columns(df, columns, csvtype='variables'):
     for col, val in columns.items():
         if (col in CSV_TYPE_TO_COLS[csvtype]) & (col not in existing_cols):
             df[col] = val
-    return df
\ No newline at end of file
+    return df
+
+# Default constant columns of stata_to_csv_batch(). Values are templates that are
+# filled with fields of the dta file path, ex.: {stem}.
+BATCH_CONSTANT_COLUMNS = {
+    "study": "",
+    "dataset": "{stem}",
+    "version": "",
+    "label": "",
+    "concept": "",
+    "type": "",
+    "description": "",
+    "description_de": "",
+    "minedition": "",
+    "template_id": "",
+}
+
+
+def stata_to_csv_batch(
+        inputs,
+        output_dir,
+        constant_columns=None,
+        path_pattern=None,
+        label_var='label_de',
+        manifest=None,
+        n_jobs=1,
+    ):
+    """Converts many Stata dta-files to SOEP-style variables.csv and variable_categories.csv
+    with stata_to_csv(). Files are converted in a pool of processes.
+
+    The output directory and the values of constant columns are templates that are filled
+    with fields of each file's path: 'stem' (file name without extension), 'parent' (name of
+    parent directory), and the named groups of 'path_pattern'.
+
+    Parameters
+    ----------
+    inputs : str, Path, or list
+        Directory of dta-files, glob pattern (ex.: 'releases/v39/*.dta'), or list of files.
+    output_dir : str
+        Template of the output directory. Ex.: 'datasets/{stem}/{version}'
+    constant_columns : dict, optional
+        Templates of constant columns, see stata_to_csv(). Ex.: {'version': '{version}'}.
+        Updates BATCH_CONSTANT_COLUMNS. Default is None.
+    path_pattern : str, optional
+        Regular expression with named groups that is matched against the file path.
+        Ex.: r'(?P<version>v\\d+)/(?P<dataset>\\w+)\\.dta$'. Default is None.
+    label_var : str, optional
+        Name of column in which variable labels and value labels are stored. Default is 'label_de'.
+    manifest : str or Path, optional
+        JSON file that records converted files. Files that have not changed since their
+        last conversion with the same options are skipped. Default is None.
+    n_jobs : int, optional
+        Number of processes. Default is 1.
+
+    Returns
+    -------
+    DataFrame
+        One row per file with columns 'file', 'output_dir', 'status' ('converted',
+        'skipped', or 'failed'), and 'error'.
+    """
+
+    import json
+    import re
+
+    files = _find_dta_files(inputs)
+    templates = dict(BATCH_CONSTANT_COLUMNS)
+    if constant_columns is not None:
+        templates.update(constant_columns)
+
+    records = {}
+    if (manifest is not None) and Path(manifest).exists():
+        with open(manifest, 'r', encoding='utf-8') as f:
+            records = json.load(f).get('files', {})
+
+    # Resolve templates for each file
+    jobs = []
+    summary = []
+    for file in files:
+        fields = {'stem': file.stem, 'parent': file.parent.name}
+        if path_pattern is not None:
+            match = re.search(path_pattern, file.as_posix())
+            if match is not None:
+                fields.update({k: v for k, v in match.groupdict().items() if v is not None})
+        try:
+            out = output_dir.format(**fields)
+            columns = {col: str(val).format(**fields) for col, val in templates.items()}
+        except KeyError as e:
+            summary.append({'file': str(file), 'output_dir': '', 'status': 'failed', 'error': f"Unknown field {e}"})
+            continue
+
+        record = {
+            'fingerprint': stat_fingerprint(file),
+            'output_dir': out,
+            'constant_columns': columns,
+            'label_var': label_var,
+        }
+        previous = records.get(str(file.resolve()))
+        if (previous == record) and Path(out, 'variables.csv').exists():
+            summary.append({'file': str(file), 'output_dir': out, 'status': 'skipped', 'error': ''})
+            continue
+        jobs.append((file, record))
+
+    # Convert files
+    args = [(str(file), record['output_dir'], record['constant_columns'], label_var) for file, record in jobs]
+    errors = parallel_map(_convert_one, args, n_jobs=n_jobs)
+
+    for (file, record), error in zip(jobs, errors):
+        status = 'converted' if error=='' else 'failed'
+        summary.append({'file': str(file), 'output_dir': record['output_dir'], 'status': status, 'error': error})
+        if status=='converted':
+            records[str(file.resolve())] = record
+        else:
+            records.pop(str(file.resolve()), None)
+
+    if manifest is not None:
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump({'files': records}, f, indent=1, sort_keys=True)
+
+    return pd.DataFrame(summary, columns=['file', 'output_dir', 'status', 'error'])
+
+
+def stata_to_csv_cli():
+    """Converts Stata dta-files to SOEP-style variables.csv and variable_categories.csv.
+    For command line use. See stata_to_csv_batch().
+
+    Ex.: stata_to_csv "releases/v39/*.dta" "datasets/{stem}/v39" --constant study=soep-core version=v39 --jobs 4
+    """
+
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("inputs", help="Directory of dta-files or glob pattern")
+    parser.add_argument("output_dir", help="Template of output directory, ex.: 'datasets/{stem}/v39'")
+    parser.add_argument("--constant", nargs="*", default=[], metavar="COLUMN=VALUE",
+                        help="Constant columns, values can be templates, ex.: version={version}")
+    parser.add_argument("--pattern", default=None, help="Regular expression with named groups matched against file paths")
+    parser.add_argument("--label-var", default="label_de", help="Column of labels, default 'label_de'")
+    parser.add_argument("--manifest", default=None, help="JSON file to skip unchanged files")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of processes")
+    args = parser.parse_args()
+
+    constant_columns = dict(c.split("=", 1) for c in args.constant)
+    summary = stata_to_csv_batch(
+        args.inputs,
+        args.output_dir,
+        constant_columns=constant_columns,
+        path_pattern=args.pattern,
+        label_var=args.label_var,
+        manifest=args.manifest,
+        n_jobs=args.jobs,
+    )
+
+    for row in summary.itertuples():
+        print(f"{row.status}: {row.file}" + (f" ({row.error})" if row.error else ""))
+
+    return None
+
+
+def _find_dta_files(inputs):
+    """Returns a sorted list of dta-files from a directory, a glob pattern, or a list of files."""
+    from glob import glob
+
+    if isinstance(inputs, (list, tuple)):
+        return [Path(f) for f in inputs]
+    if Path(inputs).is_dir():
+        return sorted(Path(inputs).glob('*.dta'))
+    return sorted(Path(f) for f in glob(str(inputs), recursive=True))
+
+
+def _convert_one(args):
+    """Converts a single dta-file. Returns an error message or ''."""
+    file, output_dir, constant_columns, label_var = args
+    try:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        stata_to_csv(file, output_dir, label_var=label_var, constant_columns=constant_columns)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return ''
+
+
+def label_stata(
+        data,
+        output,
+        variables=None,
+        variable_categories=None,
+        label_var='label_de',
+        chunk_size=1<<24,
+    ):
+    """Applies the labels of SOEP-style variables.csv and variable_categories.csv to a
+    Stata dta-file. Inverse of stata_to_csv().
+
+    Only the label sections of the file are rewritten. Observations are copied byte by
+    byte in chunks of 'chunk_size' bytes, so that large files are labelled without
+    reading them into memory. Supports dta-files of format 117, 118 and 119 (Stata 13+).
+
+    Variables that are not contained in variables.csv keep their variable label, and
+    variables that are not contained in variable_categories.csv keep their value labels.
+    Variables with identical value labels share a single value-label set. Value labels of
+    string variables are ignored.
+
+    Labels are written in one language only, the one of 'label_var'. Stata label languages
+    (label language) are not created, and a second call with another 'label_var' replaces
+    the labels of the first call.
+
+    Parameters
+    ----------
+    data : Stata dta-file
+    output : str or path
+        Labelled dta-file. Must differ from 'data'.
+    variables : DataFrame, str, or path, optional
+        SOEP-style variables.csv. Default is None.
+    variable_categories : DataFrame, str, or path, optional
+        SOEP-style variable_categories.csv. Default is None.
+    label_var : str, optional
+        Column of labels, ex.: 'label' or 'label_de'. Default is 'label_de'.
+    chunk_size : int, optional
+        Number of bytes copied at once. Default is 16 MB.
+
+    Returns
+    -------
+    Labelled dta-file
+    """
+    import struct
+
+    if Path(data).resolve() == Path(output).resolve():
+        print("Output file must differ from input file.")
+        raise ValueError
+
+    with StataReader(data) as reader:
+        old_variable_labels = reader.variable_labels()
+        old_value_labels = reader.value_labels()
+        datatypes = _header_datatypes(reader)
+        label_names = list(reader._lbllist)
+    varlist = list(old_variable_labels.keys())
+
+    with open(data, 'rb') as f:
+        layout = _read_dta_layout(f)
+
+    # Variable labels
+    new_variable_labels = dict(old_variable_labels)
+    if variables is not None:
+        variables = _read_labels_csv(variables, 'variables', ['variable', label_var])
+        labels = dict(zip(variables['variable'], variables[label_var]))
+        new_variable_labels.update({var: labels[var] for var in varlist if var in labels})
+
+    # Value labels
+    value_labels = dict(old_value_labels)
+    if variable_categories is not None:
+        variable_categories = _read_labels_csv(
+            variable_categories, 'variable_categories', ['variable', 'value', label_var]
+        )
+        # Stata allows value labels only for numeric variables
+        string_vars = [var for var in varlist if datatypes[var]=='object']
+        dropped = variable_categories['variable'].isin(string_vars)
+        if dropped.any():
+            print(
+                f"Value labels of string variables are ignored ({dropped.sum()} rows): "
+                f"{variable_categories.loc[dropped, 'variable'].unique().tolist()[:5]}"
+            )
+        sets, var_to_set = build_value_labels(variable_categories[~dropped], label_var)
+
+        # Old sets that are still used keep their names, new sets get unique names
+        covered = [var in var_to_set for var in varlist]
+        kept = {name for name, c in zip(label_names, covered) if name and not c}
+        value_labels = {name: labels for name, labels in old_value_labels.items() if name in kept}
+        set_names = {}
+        for set_id, labels in sets.items():
+            name = _unique_label_name(set_id, value_labels)
+            set_names[set_id] = name
+            value_labels[name] = labels
+        label_names = [
+            set_names.get(var_to_set.get(var), '') if c else name
+            for var, name, c in zip(varlist, label_names, covered)
+        ]
+
+    # Rewrite label sections, copy everything else
+    encoding = 'latin-1' if layout['release']==117 else 'utf-8'
+    bo = layout['byteorder']
+    name_width = 33 if layout['release']==117 else 129
+    label_width = 81 if layout['release']==117 else 321
+    offsets = layout['map']
+
+    value_label_names = b'<value_label_names>' + b''.join(
+        _fixed_bytes(name, name_width, encoding) for name in label_names
+    ) + b'</value_label_names>'
+    variable_labels = b'<variable_labels>' + b''.join(
+        _fixed_bytes(new_variable_labels.get(var, ''), label_width, encoding) for var in varlist
+    ) + b'</variable_labels>'
+    value_labels_section = _value_labels_bytes(value_labels, name_width, encoding, bo)
+
+    offsets = list(offsets)
+    offsets[12] = offsets[11] + len(value_labels_section)
+    offsets[13] = offsets[12] + len(b'</stata_dta>')
+
+    with open(data, 'rb') as src, open(output, 'wb') as dst:
+        head = bytearray(src.read(offsets[6]))
+        head[layout['map_position']:layout['map_position'] + 14*8] = struct.pack(bo + '14Q', *offsets)
+        dst.write(head)
+        dst.write(value_label_names)
+        dst.write(variable_labels)
+
+        # Characteristics, observations and strLs
+        src.seek(offsets[8])
+        remaining = offsets[11] - offsets[8]
+        while remaining > 0:
+            chunk = src.read(min(chunk_size, remaining))
+            if not chunk:
+                print(f"Unexpected end of file: {data}")
+                raise ValueError
+            dst.write(chunk)
+            remaining -= len(chunk)
+
+        dst.write(value_labels_section)
+        dst.write(b'</stata_dta>')
+
+    return None
+
+
+def build_value_labels(variable_categories, label_var='label_de'):
+    """Builds value-label sets from a SOEP-style variable_categories.csv. Variables with
+    identical value labels share a single set.
+
+    Args:
+        variable_categories (DataFrame): SOEP-style variable_categories.csv.
+        label_var (str, optional): Column of labels. Defaults to 'label_de'.
+
+    Returns:
+        (dict, dict): Value-label sets of form {set name: {value: label}}, and the set
+        name of each variable. Sets are named after their first variable.
+    """
+    df = variable_categories[['variable', 'value', label_var]]
+    df = df[(df['value']!='') & (df[label_var]!='')]
+
+    values = pd.to_numeric(df['value'], errors='coerce')
+    invalid = values.isna() | (values!=values.round())
+    if invalid.any():
+        print(f"Values must be integers: {df.loc[invalid, ['variable', 'value']].values.tolist()[:5]}")
+        raise ValueError
+
+    df = df.assign(value=values.astype('int64')).sort_values(['variable', 'value'], kind='stable')
+    sets = {}
+    content_to_set = {}
+    var_to_set = {}
+    for variable, group in df.groupby('variable', sort=False):
+        content = tuple(zip(group['value'].tolist(), group[label_var].tolist()))
+        if content not in content_to_set:
+            content_to_set[content] = variable
+            sets[variable] = dict(content)
+        var_to_set[variable] = content_to_set[content]
+    return sets, var_to_set
+
+
+def _read_labels_csv(data, csvtype, columns):
+    """Reads a SOEP-style csv if necessary and checks that 'columns' exist."""
+    if not isinstance(data, pd.DataFrame):
+        from soepdoku import read_csv
+        data = read_csv(data, csvtype=csvtype)
+    missing = [col for col in columns if col not in data.columns]
+    if len(missing) > 0:
+        print(f"Columns missing in {csvtype}.csv: {missing}")
+        raise ValueError
+    return data.astype({col: str for col in columns}).fillna('')
+
+
+def _unique_label_name(name, existing, max_length=32):
+    """Returns 'name', or 'name' with a numbered suffix, that is not in 'existing'."""
+    candidate = name[:max_length]
+    k = 1
+    while candidate in existing:
+        suffix = f"_{k}"
+        candidate = name[:max_length - len(suffix)] + suffix
+        k += 1
+    return candidate
+
+
+def _fixed_bytes(text, width, encoding):
+    """Encodes text as null-terminated field of 'width' bytes. Text is truncated at a
+    character boundary."""
+    raw = text.encode(encoding, errors='replace')[:width - 1]
+    raw = raw.decode(encoding, errors='ignore').encode(encoding)
+    return raw + b'\0' * (width - len(raw))
+
+
+def _value_labels_bytes(value_labels, name_width, encoding, byteorder):
+    """Encodes the <value_labels> section of a dta-file of format 117+."""
+    import struct
+
+    parts = [b'<value_labels>']
+    for name, labels in value_labels.items():
+        items = sorted(labels.items())
+        texts = [str(label).encode(encoding, errors='replace') + b'\0' for _, label in items]
+        offsets = [0]
+        for text in texts[:-1]:
+            offsets.append(offsets[-1] + len(text))
+        n = len(items)
+        table = struct.pack(
+            byteorder + f'ii{n}i{n}i',
+            n,
+            sum(len(t) for t in texts),
+            *offsets,
+            *[int(value) for value, _ in items],
+        ) + b''.join(texts)
+        parts.append(
+            b'<lbl>' + struct.pack(byteorder + 'i', len(table))
+            + _fixed_bytes(name, name_width, encoding) + b'\0\0\0'
+            + table + b'</lbl>'
+        )
+    parts.append(b'</value_labels>')
+    return b''.join(parts)
+
+
+def _read_dta_layout(f):
+    """Reads release, byte order, and the map of section offsets from the header of a
+    dta-file of format 117+.
+
+    Returns:
+        dict: Keys 'release', 'byteorder' ('<' or '>'), 'map' (list of 14 offsets), and
+        'map_position' (position of the first offset in the file).
+    """
+    import struct
+
+    def expect(tag):
+        if f.read(len(tag)) != tag:
+            print(f"Unsupported dta-file, expected {tag!r}. Only formats 117, 118 and 119 are supported.")
+            raise ValueError
+
+    expect(b'<stata_dta><header><release>')
+    release = int(f.read(3))
+    if release not in (117, 118, 119):
+        print(f"Unsupported dta format {release}. Only formats 117, 118 and 119 are supported.")
+        raise ValueError
+    expect(b'</release><byteorder>')
+    byteorder = '<' if f.read(3)==b'LSF' else '>'
+    expect(b'</byteorder><K>')
+    f.read(4 if release==119 else 2)
+    expect(b'</K><N>')
+    f.read(4 if release==117 else 8)
+    expect(b'</N><label>')
+    if release==117:
+        (length,) = struct.unpack(byteorder + 'B', f.read(1))
+    else:
+        (length,) = struct.unpack(byteorder + 'H', f.read(2))
+    f.read(length)
+    expect(b'</label><timestamp>')
+    (length,) = struct.unpack(byteorder + 'B', f.read(1))
+    f.read(length)
+    expect(b'</timestamp></header><map>')
+    map_position = f.tell()
+    offsets = list(struct.unpack(byteorder + '14Q', f.read(14*8)))
+    return {'release': release, 'byteorder': byteorder, 'map': offsets, 'map_position': map_position}
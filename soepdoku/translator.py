@@ -1,14 +1,27 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+from .memory import TranslationMemory, glossary_fingerprint
+from .backends import TranslationBackend, FuzzyMemoryBackend, _same_language
+from .utils import str_column
+
+
 class Translator:
     """Provides methods to translate metadata with third party translation APIs.
     """    
 
-    def __init__(self, service=None, auth_key=None, **kwargs):
+    def __init__(self, service=None, auth_key=None, memory=None, **kwargs):
         """Set up for translation
 
         Args:
-            service (str, optional): A translation service. Currently, only 'deepl' is supported. 
+            service (str or TranslationBackend, optional): A translation service: 'deepl', 'memory'
+                for an offline FuzzyMemoryBackend built from kwargs, or a TranslationBackend.
                 Defaults to None.
             auth_key (str, optional): Authentication key for selected translation service. Defaults to None.
+            memory (TranslationMemory, Path, or str, optional): Translation memory, or SQLite file of a
+                translation memory, that is checked before texts are sent to the translation service.
+                New translations are added to the memory. Defaults to None.
 
         Raises:
             ValueError: If an unsupported translation service is selected.
@@ -16,16 +29,26 @@ class Translator:
         
         self.service = service
         self.auth_key = auth_key
+        if (memory is not None) and not isinstance(memory, TranslationMemory):
+            memory = TranslationMemory(memory)
+        self.memory = memory
+        self.glossaries = {}  # (fingerprint, source_lang, target_lang) -> glossary of service
 
         if service == "deepl":
             import deepl
             self.translator = deepl.Translator(self.auth_key, **kwargs)
-            self.translate_text = self.translator.translate_text
+
+        elif service == "memory":
+            self.translator = FuzzyMemoryBackend(**kwargs)
+
+        elif isinstance(service, TranslationBackend):
+            self.translator = service
 
         else:
             raise ValueError(
-                "Please provide a valid translation service. Currently, deepl is supported."
+                "Please provide a valid translation service: 'deepl', 'memory', or a TranslationBackend."
             )
+        self.translate_text = self.translator.translate_text
 
     def translate(
             self,
@@ -36,9 +59,24 @@ class Translator:
             missings=False,
             source_target=None,
             glossary=None,
+            batch_size=50,
+            batch_chars=30000,
+            n_jobs=1,
+            rate_limit=None,
+            retries=3,
+            backoff=1.0,
+            context=None,
             **kwargs
         ):
-        """Translates specified columns of a dataframe row by row.
+        """Translates specified columns of a dataframe. All translatable cells are collected
+        first, identical texts are translated only once, and texts are sent to the translation
+        service in batches.
+
+        With option 'context', the texts of all rows of a group, ex.: all items of a question,
+        are translated together in one text. Texts are separated by XML tags, and the
+        translation is split back into cells. Groups that fail or whose translation cannot be
+        split are translated cell by cell, as are rows with a missing group. The translation
+        memory stores the translations of single cells, not of groups.
 
         Args:
             df (DataFrame): DataFrame with text to be translated.
@@ -51,6 +89,20 @@ class Translator:
                 Ex.: {'label_de': 'label'}. Defaults to None.
             glossary (dict, optional): Dictionary of terms that shall be translated as specified.
                 glossary = {'Arbeitsprobe': 'work trial','Anteil': 'share'}. Defaults to None.
+            batch_size (int, optional): Maximum number of texts per request. Defaults to 50.
+            batch_chars (int, optional): Maximum number of characters per request. Defaults to 30000.
+            n_jobs (int, optional): Number of concurrent requests. Defaults to 1.
+            rate_limit (float, optional): Maximum number of requests per second. Defaults to None.
+            retries (int, optional): Number of retries of a failed request. Defaults to 3.
+            backoff (float, optional): Seconds to wait before the first retry. The waiting time
+                doubles with every retry. Defaults to 1.0.
+            context (str or list of str, optional): Columns that define groups of rows translated
+                together, ex.: 'question' in questions.csv or 'variable' in variable_categories.csv.
+                Defaults to None.
+
+        Returns:
+            DataFrame: Cells that could not be translated, with columns 'index', 'source',
+            'target', 'text', and 'error'.
 
         Raises:
             ValueError: If source_target is not provided.
@@ -68,37 +120,309 @@ class Translator:
                 raise KeyError()
         
         # Set up glossary
-        if glossary is not None:
-            if self.service=='deepl':
-                glos = self.translator.create_glossary(
-                    "Glossary",
-                    source_lang,
-                    target_lang,
-                    glossary
+        glos = self.get_glossary(glossary, source_lang, target_lang)
+
+        # Collect translatable cells
+        cells = []  # (source, target, row positions, texts)
+        for source, target in source_target.items():
+            mask = self.translatable_mask(df, source, target, replace, missings)
+            positions = np.flatnonzero(mask)
+            cells.append((source, target, positions, df[source].to_numpy(dtype=object)[positions]))
+
+        options = dict(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            glos=glos,
+            fingerprint=glossary_fingerprint(glossary),
+            batch_size=batch_size,
+            batch_chars=batch_chars,
+            n_jobs=n_jobs,
+            limiter=RateLimiter(rate_limit) if rate_limit is not None else None,
+            retries=retries,
+            backoff=backoff,
+        )
+
+        # Translate each distinct text once
+        if context is None:
+            texts = [text for _, _, _, texts in cells for text in texts]
+            translations, errors = self._translate_texts(texts, **options)
+            results = [
+                (
+                    np.array([translations.get(text) for text in texts], dtype=object),
+                    [errors.get(text, '') for text in texts],
                 )
+                for _, _, _, texts in cells
+            ]
+
+        # Translate the texts of a group of rows together
         else:
-            glos = None
+            if isinstance(context, str):
+                context = [context]
+            results = [
+                (np.full(len(texts), None, dtype=object), [''] * len(texts))
+                for _, _, _, texts in cells
+            ]
+
+            # Cells in the translation memory are not sent
+            known = {}
+            if self.memory is not None:
+                texts = list(dict.fromkeys(text for _, _, _, texts in cells for text in texts))
+                known = self.memory.get(texts, source_lang, target_lang, options['fingerprint'])
+
+            groups = []  # (cell, positions in cell, document)
+            fallback = []  # (cell, positions in cell)
+            for k, (_, _, positions, texts) in enumerate(cells):
+                todo = np.array([text not in known for text in texts], dtype=bool)
+                for m in np.flatnonzero(~todo):
+                    results[k][0][m] = known[texts[m]]
 
-        for i in df.index:
-            for source, target in source_target.items():
+                # Rows without group are translated cell by cell
+                keys = df[context].iloc[positions]
+                ungrouped = todo & keys.isna().any(axis=1).to_numpy()
+                if ungrouped.any():
+                    fallback.append((k, np.flatnonzero(ungrouped)))
+
+                grouped = np.flatnonzero(todo & ~ungrouped)
+                for members in keys.iloc[grouped].groupby(context, sort=False).indices.values():
+                    members = grouped[members]
+                    groups.append((k, members, _join_segments(texts[members])))
+
+            # Group documents are not stored in the memory, only their segments
+            translations, _ = self._translate_texts(
+                [document for _, _, document in groups], tag_handling='xml', use_memory=False, **options
+            )
+            segments_by_text = {}
+            for k, members, document in groups:
+                segments = _split_segments(translations.get(document), len(members))
+                if segments is not None:
+                    results[k][0][members] = segments
+                    segments_by_text.update(zip(cells[k][3][members], segments))
+                else:
+                    fallback.append((k, members))
+            if (self.memory is not None) & (len(segments_by_text) > 0):
+                self.memory.put(segments_by_text, source_lang, target_lang, options['fingerprint'])
 
-                text = df.at[i, source]
-                if self.translatable(text, df.loc[i], source, target, replace, missings):
-                    
+            # Groups that failed or whose translation cannot be split are translated cell by cell
+            if len(fallback) > 0:
+                texts = [cells[k][3][m] for k, members in fallback for m in members]
+                translations, errors = self._translate_texts(texts, **options)
+                for k, members in fallback:
+                    for m in members:
+                        text = cells[k][3][m]
+                        results[k][0][m] = translations.get(text)
+                        results[k][1][m] = errors.get(text, '')
+
+        # Scatter translations to target columns
+        failed = []
+        for (source, target, positions, texts), (translated, errs) in zip(cells, results):
+            done = np.array([result is not None for result in translated], dtype=bool)
+            if done.any():
+                df.iloc[positions[done], df.columns.get_loc(target)] = translated[done]
+            failed.extend(
+                (df.index[positions[m]], source, target, texts[m], errs[m])
+                for m in np.flatnonzero(~done)
+            )
+
+        if len(failed) > 0:
+            print(f"Translation of {len(failed)} cells failed.")
+        return pd.DataFrame(failed, columns=['index', 'source', 'target', 'text', 'error'])
+
+    def _translate_texts(
+            self,
+            texts,
+            source_lang,
+            target_lang,
+            glos,
+            fingerprint,
+            batch_size,
+            batch_chars,
+            n_jobs,
+            limiter,
+            retries,
+            backoff,
+            use_memory=True,
+            **kwargs
+        ):
+        """Translates distinct texts in batches. Texts in the translation memory are not sent.
+        If use_memory is False, the translation memory is neither read nor updated.
+
+        Returns:
+            (dict, dict): Translations and error messages of failed texts by text.
+        """
+        memory = self.memory if use_memory else None
+        texts = list(dict.fromkeys(texts))
+        translations = {}
+        if memory is not None:
+            translations = memory.get(texts, source_lang, target_lang, fingerprint)
+            texts = [text for text in texts if text not in translations]
+
+        def translate_batch(batch):
+            results = self.request(
+                batch,
+                source_lang=source_lang,
+                target_lang=target_lang,
+                glossary=glos,
+                retries=retries,
+                backoff=backoff,
+                limiter=limiter,
+                **kwargs
+            )
+            results = {text: str(result) for text, result in zip(batch, results) if result is not None}
+            if memory is not None:
+                memory.put(results, source_lang, target_lang, fingerprint)
+            return results
+
+        batches = self.batches(texts, batch_size=batch_size, batch_chars=batch_chars)
+        errors = {}
+        if n_jobs==1:
+            for batch in batches:
+                try:
+                    translations.update(translate_batch(batch))
+                except Exception as e:
+                    errors.update({text: f"{type(e).__name__}: {e}" for text in batch})
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [(batch, executor.submit(translate_batch, batch)) for batch in batches]
+                for batch, future in futures:
                     try:
-                        result = ""
-                        result = self.translate_text(
-                            text,
-                            source_lang=source_lang,
-                            target_lang=target_lang,
-                            glossary=glos,
-                        )
-                    except:
-                        pass
-                    else:
-                        df.at[i, target] = result
-                       
-                    
+                        translations.update(future.result())
+                    except Exception as e:
+                        errors.update({text: f"{type(e).__name__}: {e}" for text in batch})
+
+        # Texts the service returned no translation for
+        errors.update({
+            text: "No translation found."
+            for text in texts if (text not in translations) and (text not in errors)
+        })
+        return translations, errors
+
+    def request(self, texts, source_lang, target_lang, glossary=None, retries=3, backoff=1.0, limiter=None, **kwargs):
+        """Sends texts to the translation service. Requests that fail with a transient error
+        (rate limit, server or connection error) are retried with exponential backoff. Other
+        errors are raised immediately.
+
+        Args:
+            texts (list of str): Texts to be translated.
+            source_lang (str): Source language.
+            target_lang (str): Target language.
+            glossary (optional): Glossary of the translation service. Defaults to None.
+            retries (int, optional): Number of retries. Defaults to 3.
+            backoff (float, optional): Seconds to wait before the first retry. Defaults to 1.0.
+            limiter (RateLimiter, optional): Limits the rate of requests. Defaults to None.
+            **kwargs: Further options of the translation service, ex.: tag_handling='xml'.
+
+        Returns:
+            list: Translations in the order of texts.
+
+        Raises:
+            Exception: The exception of the last attempt if all attempts failed.
+        """
+        for attempt in range(retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                return self.translate_text(
+                    texts,
+                    source_lang=source_lang,
+                    target_lang=target_lang,
+                    glossary=glossary,
+                    **kwargs
+                )
+            except Exception as e:
+                if (attempt==retries) or not _is_transient(e):
+                    raise
+                time.sleep(backoff * 2**attempt)
+
+    def get_glossary(self, glossary, source_lang, target_lang):
+        """Returns a glossary of the translation service. Glossaries are identified by
+        their content and language pair: a glossary is reused from earlier calls or from
+        the glossaries stored by the service, and only created if it does not exist yet.
+
+        Args:
+            glossary (dict or None): Dictionary of terms, ex.: {'Anteil': 'share'}.
+            source_lang (str): Source language.
+            target_lang (str): Target language.
+
+        Returns:
+            Glossary of the translation service, or None if glossary is None.
+        """
+        if glossary is None:
+            return None
+
+        fingerprint = glossary_fingerprint(glossary)
+        key = (fingerprint, source_lang, target_lang)
+        if key in self.glossaries:
+            return self.glossaries[key]
+
+        glos = None
+        if hasattr(self.translator, 'create_glossary'):
+            name = f"soepdoku-{fingerprint[:16]}"
+            for info in self.translator.list_glossaries():
+                if (info.name==name) & _same_language(info.source_lang, source_lang) & _same_language(info.target_lang, target_lang):
+                    glos = info
+                    break
+            if glos is None:
+                glos = self.translator.create_glossary(name, source_lang, target_lang, glossary)
+
+        self.glossaries[key] = glos
+        return glos
+
+    def batches(self, texts, batch_size=50, batch_chars=30000):
+        """Splits a list of texts into batches with at most 'batch_size' texts and at most
+        'batch_chars' characters. A text longer than 'batch_chars' forms its own batch.
+
+        Args:
+            texts (list of str): Texts to be translated.
+            batch_size (int, optional): Maximum number of texts per batch. Defaults to 50.
+            batch_chars (int, optional): Maximum number of characters per batch. Defaults to 30000.
+
+        Returns:
+            list of list of str
+        """
+        batches = []
+        batch, chars = [], 0
+        for text in texts:
+            if batch and ((len(batch) >= batch_size) or (chars + len(text) > batch_chars)):
+                batches.append(batch)
+                batch, chars = [], 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def translatable_mask(self, df, source, target, replace=False, missings=False):
+        """Tests for all rows of a dataframe if the text in column 'source' shall be translated
+        based on the provided options. Vectorized version of translatable().
+
+        Args:
+            df (DataFrame): DataFrame with text to be translated.
+            source (str): Source column.
+            target (str): Target column.
+            replace (bool, optional): If True, rows with text in target column are translated.
+                Defaults to False.
+            missings (bool, optional): If True, labels of SOEP-style missing values are translated.
+                Defaults to False.
+
+        Returns:
+            ndarray: Boolean mask of rows to be translated.
+        """
+
+        # Case: Emtpy text
+        mask = str_column(df[source]).str.strip()!=''
+
+        # Case: Target contains text and option replace==False
+        if replace==False:
+            mask &= str_column(df[target]).str.strip()==''
+
+        # Case: text is value label of SOEP missing value and option missings=False
+        if ('value' in df.columns) & (target in ['label', 'label_de']) & (missings==False):
+            values = pd.to_numeric(df['value'], errors='coerce')
+            negative = (values < 0) & (values==values.round())
+            mask &= ~negative.to_numpy(dtype=bool)
+
+        return mask.to_numpy(dtype=bool)
 
     def translatable(self, text, row, source, target, replace, missings):
         """Tests if 'text' from a dataframe 'row' shall be translated based on the provided options.
@@ -128,13 +452,80 @@ class Translator:
         # Case: text is value label of SOEP missing value and option missings=False
         if ('value' in row.index) & (target in ['label', 'label_de']) & (missings==False):
             try:
-                value = int(row['value'])
+                value = float(row['value'])
             except:
                 pass
             else: 
-                if value<0:
+                if (value<0) & value.is_integer():
                     return False
         return True
 
     def is_empty(self, string):
-        return string.strip()==""
\ No newline at end of file
+        return string.strip()==""
+
+def _is_transient(exception):
+    """Tests if an exception of a translation service is transient: HTTP status 429 or 5xx,
+    or a connection error, including DeepL's TooManyRequestsException and ConnectionException."""
+    names = {cls.__name__ for cls in type(exception).__mro__}
+    if names & {'TooManyRequestsException', 'ConnectionException'}:
+        return True
+
+    status = getattr(exception, 'http_status_code', None) or getattr(exception, 'code', None)
+    if status is None:
+        status = getattr(getattr(exception, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return (status==429) or (500 <= status < 600)
+
+    return isinstance(exception, (ConnectionError, TimeoutError)) or ('URLError' in names)
+
+
+def _join_segments(texts):
+    """Joins texts to a single XML text with one <t> element per text."""
+    from xml.sax.saxutils import escape
+    return "\n".join(f"<t>{escape(text)}</t>" for text in texts)
+
+
+def _split_segments(document, n):
+    """Splits a translated XML text of _join_segments() into its texts. Returns None if
+    document is None or does not contain 'n' texts."""
+    import re
+    from xml.sax.saxutils import unescape
+
+    if document is None:
+        return None
+    segments = re.findall(r"<t>(.*?)</t>", document, flags=re.S)
+    if len(segments)!=n:
+        return None
+    return [unescape(segment) for segment in segments]
+
+
+class RateLimiter:
+    """Token bucket that limits the rate of requests across threads. Tokens are refilled
+    at 'rate' tokens per second up to 'capacity' tokens; every request takes one token.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """Creates a RateLimiter.
+
+        Args:
+            rate (float): Number of requests per second.
+            capacity (int, optional): Maximum number of requests in a burst. Defaults to 1.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token. Waits until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return None
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
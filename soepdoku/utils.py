@@ -47,3 +47,78 @@ def get_missings(study="", dataset="", version="", variable=""):
     return missings
     
 
+
+
+def file_fingerprint(path, chunk_size=1<<20):
+    """Computes a fingerprint of the content of a file. Files with identical
+    content have identical fingerprints.
+
+    Args:
+        path (Path or str): Path to file.
+        chunk_size (int, optional): Number of bytes read at once. Defaults to 1 MiB.
+
+    Returns:
+        str: Hexadecimal SHA-1 digest of the file content.
+    """
+
+    import hashlib
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stat_fingerprint(path):
+    """Computes a fingerprint of a file from its size and modification time.
+    Cheaper than file_fingerprint() because the file is not read.
+
+    Args:
+        path (Path or str): Path to file.
+
+    Returns:
+        str: Fingerprint of the form '<size>-<mtime in ns>'.
+    """
+
+    import os
+
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def parallel_map(function, args, n_jobs=1, chunksize=1):
+    """Applies a function to each element of args, optionally in a pool of
+    processes. The order of the results matches the order of args.
+
+    Args:
+        function (callable): Picklable function of one argument.
+        args (list): Arguments passed to function one at a time.
+        n_jobs (int, optional): Number of processes. If 1, no pool is used. Defaults to 1.
+        chunksize (int, optional): Number of arguments sent to a process at once. Defaults to 1.
+
+    Returns:
+        list: Results of function for each element of args.
+    """
+
+    args = list(args)
+    if (n_jobs==1) | (len(args) <= 1):
+        return [function(a) for a in args]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(function, args, chunksize=chunksize))
+
+
+def str_column(column):
+    """Returns a column as strings with missing values as ''.
+
+    Args:
+        column (pd.Series): Column of any dtype.
+
+    Returns:
+        pd.Series: Column of str.
+    """
+
+    return column.astype(object).where(column.notna(), '').astype(str)
@@ -0,0 +1,365 @@
+from pathlib import Path
+import pandas as pd
+from .const import VALID_CSV_TYPES, CSV_TYPE_TO_COLS, CSV_TYPE_TO_KEYS
+from .reader import read_csv
+from .utils import parallel_map, str_column
+
+# Columns of a validation report
+REPORT_COLUMNS = ['file', 'csvtype', 'check', 'severity', 'column', 'row', 'message']
+
+# Tables with a numeric column 'value'
+NUMERIC_VALUE_CSV_TYPES = ['answers', 'variable_categories']
+
+
+def validate_dataframe(df, csvtype=None, file=''):
+    """Validates a table of SOEP-style metadata against the standard of its type. Checks are:
+    'missing_column' (error), 'extra_column' (warning), 'empty_key' (error) for key columns
+    without text, 'duplicate_key' (error) for rows with identical keys, and 'non_numeric_value'
+    (error) for entries in column 'value' of answers and variable_categories that are not integers.
+
+    Args:
+        df (DataFrame): SOEP-style metadata.
+        csvtype (str, optional): Type of table. Defaults to None, df.csvtype.
+        file (str, optional): File name used in the report. Defaults to ''.
+
+    Returns:
+        DataFrame: Report with columns 'file', 'csvtype', 'check', 'severity', 'column',
+        'row' (index of df, or -1 for issues of the table), and 'message'.
+    """
+    if csvtype is None:
+        csvtype = df.csvtype
+
+    issues = []
+    def add(check, severity, column, rows, message):
+        rows = list(rows)
+        issues.append(pd.DataFrame({
+            'file': str(file),
+            'csvtype': csvtype,
+            'check': check,
+            'severity': severity,
+            'column': column,
+            'row': rows,
+            'message': message if isinstance(message, list) else [message] * len(rows),
+        }))
+
+    # Columns
+    expected = CSV_TYPE_TO_COLS[csvtype]
+    for col in expected:
+        if col not in df.columns:
+            add('missing_column', 'error', col, [-1], f"Column '{col}' is missing.")
+    for col in df.columns:
+        if (col not in expected) & (col!='filter_parsed'):
+            add('extra_column', 'warning', col, [-1], f"Column '{col}' is not a standard column.")
+
+    # Keys
+    keys = [col for col in CSV_TYPE_TO_KEYS[csvtype] if col in df.columns]
+    for col in keys:
+        empty = str_column(df[col]).str.strip()==''
+        if empty.any():
+            add('empty_key', 'error', col, df.index[empty.to_numpy()], f"Key column '{col}' is empty.")
+
+    if len(keys) > 0:
+        duplicated = df.duplicated(subset=keys, keep=False).to_numpy()
+        if duplicated.any():
+            rows = df.index[duplicated]
+            first = df.loc[duplicated, keys].groupby(keys, sort=False).ngroup()
+            add(
+                'duplicate_key', 'error', ','.join(keys), rows,
+                [f"Duplicate key, group {g}." for g in first],
+            )
+
+    # Values
+    if (csvtype in NUMERIC_VALUE_CSV_TYPES) & ('value' in df.columns):
+        values = str_column(df['value']).str.strip()
+        invalid = ~values.str.fullmatch(r'-?\d+') & (values!='')
+        if invalid.any():
+            add(
+                'non_numeric_value', 'error', 'value', df.index[invalid.to_numpy()],
+                [f"Value '{v}' is not an integer." for v in values[invalid]],
+            )
+
+    if len(issues)==0:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.concat(issues, ignore_index=True)[REPORT_COLUMNS]
+
+
+def validate_file(csvfile, csvtype=None):
+    """Reads and validates a SOEP-style CSV file. See validate_dataframe().
+
+    Args:
+        csvfile (Path or str): CSV file.
+        csvtype (str, optional): Type of CSV file. Defaults to None, inferred from file name.
+
+    Returns:
+        DataFrame: Validation report.
+    """
+    try:
+        df = read_csv(csvfile, csvtype=csvtype)
+    except Exception as e:
+        return pd.DataFrame(
+            [(str(csvfile), csvtype or '', 'read_error', 'error', '', -1, f"{type(e).__name__}: {e}")],
+            columns=REPORT_COLUMNS,
+        )
+    return validate_dataframe(df, csvtype=df.csvtype, file=csvfile)
+
+
+def validate_repository(root, n_jobs=1):
+    """Validates all SOEP-style CSV files of a metadata repository. Files are found recursively
+    by their name, ex.: 'datasets/pl/v39/variables.csv', and validated in a pool of processes.
+
+    Args:
+        root (Path or str): Root directory of the metadata repository.
+        n_jobs (int, optional): Number of processes. Defaults to 1.
+
+    Returns:
+        DataFrame: Consolidated validation report of all files. Column 'file' contains paths
+        relative to root.
+    """
+    root = Path(root)
+    files = sorted(f for f in root.rglob('*.csv') if f.stem in VALID_CSV_TYPES)
+
+    reports = parallel_map(validate_file, files, n_jobs=n_jobs, chunksize=16)
+
+    reports = [
+        r.assign(file=f.relative_to(root).as_posix()) for f, r in zip(files, reports) if len(r) > 0
+    ]
+    if len(reports)==0:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.concat(reports, ignore_index=True)
+
+
+def validate_cli():
+    """Validates a SOEP-style metadata repository and prints a summary of issues. Exits with
+    status 1 if errors were found. For command line use.
+
+    Ex.: validate_metadata "C:/Dokumentation" --jobs 4 --report report.csv
+    """
+    import sys
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("root", help="Root directory of metadata repository")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of processes")
+    parser.add_argument("--report", default=None, help="CSV file of the full report")
+    parser.add_argument("--references", action="store_true", help="Check references between tables")
+    args = parser.parse_args()
+
+    report = validate_repository(args.root, n_jobs=args.jobs)
+    if args.references:
+        references = check_repository_references(args.root, n_jobs=args.jobs)
+        references = references.rename(columns={'source': 'file', 'key': 'column'})
+        report = pd.concat(
+            [report, references.assign(csvtype='', severity='error')[REPORT_COLUMNS]],
+            ignore_index=True,
+        )
+    if args.report is not None:
+        report.to_csv(args.report, index=False)
+
+    if len(report)==0:
+        print("No issues found.")
+    else:
+        summary = report.groupby(['severity', 'check', 'file']).size().rename('count').reset_index()
+        print(summary.to_string(index=False))
+
+    if (report['severity']=='error').any():
+        sys.exit(1)
+    return None
+
+
+# References between tables: (name, table, columns, referenced table, referenced columns)
+REFERENCES = [
+    (
+        'answer_list',
+        'questions', ['study', 'questionnaire', 'answer_list'],
+        'answers', ['study', 'questionnaire', 'answer_list'],
+    ),
+    (
+        'categories_variable',
+        'variable_categories', ['study', 'dataset', 'version', 'variable'],
+        'variables', ['study', 'dataset', 'version', 'variable'],
+    ),
+    (
+        'logical_variable',
+        'logical_variables', ['dataset', 'variable'],
+        'variables', ['dataset', 'variable'],
+    ),
+]
+
+# Columns of a report of check_references()
+REFERENCE_REPORT_COLUMNS = ['check', 'source', 'row', 'key', 'message']
+
+
+def load_key_columns(root, n_jobs=1, filters=True):
+    """Loads the columns of a metadata repository that are used by check_references().
+    Only the needed columns of each CSV file are read.
+
+    Args:
+        root (Path or str): Root directory of the metadata repository.
+        n_jobs (int, optional): Number of processes. Defaults to 1.
+        filters (bool, optional): If True, column 'filter' of questions.csv is read.
+            Defaults to True.
+
+    Returns:
+        dict: Dictionary of form {csvtype: DataFrame}. DataFrames contain the column 'source'
+        with the path of the CSV file relative to root, and 'row' with the row in the file.
+    """
+    columns = {}
+    for _, table, cols, ref_table, ref_cols in REFERENCES:
+        columns.setdefault(table, set()).update(cols)
+        columns.setdefault(ref_table, set()).update(ref_cols)
+    columns['questions'].update(CSV_TYPE_TO_KEYS['questions'])
+    if filters:
+        columns['questions'].add('filter')
+
+    root = Path(root)
+    files = sorted(f for f in root.rglob('*.csv') if f.stem in columns)
+    args = [(f, sorted(columns[f.stem])) for f in files]
+    frames = parallel_map(_read_columns, args, n_jobs=n_jobs, chunksize=16)
+
+    tables = {}
+    for f, df in zip(files, frames):
+        tables.setdefault(f.stem, []).append(
+            df.assign(source=f.relative_to(root).as_posix(), row=range(len(df)))
+        )
+    return {
+        csvtype: pd.concat(dfs, ignore_index=True).reindex(columns=sorted(columns[csvtype]) + ['source', 'row'], fill_value='')
+        for csvtype, dfs in tables.items()
+    }
+
+
+def check_references(tables):
+    """Checks the referential integrity of a metadata repository with anti-joins on hashed
+    keys. Checks are:
+
+    - 'answer_list': answer lists in questions.csv exist in answers.csv of the questionnaire.
+    - 'categories_variable': variables in variable_categories.csv exist in variables.csv.
+    - 'logical_variable': (dataset, variable) in logical_variables.csv exists in a version
+      of variables.csv.
+    - 'filter_item': items in filters of questions.csv exist in the questionnaire. Uses column
+      'filter_parsed' if available, otherwise column 'filter' is parsed.
+
+    Args:
+        tables (dict): Dictionary of form {csvtype: DataFrame}, ex.: from load_key_columns()
+            or snapshot.load_snapshot().
+
+    Returns:
+        DataFrame: Report with columns 'check', 'source', 'row', 'key', and 'message'.
+    """
+    issues = []
+    for name, table, cols, ref_table, ref_cols in REFERENCES:
+        if table not in tables:
+            continue
+        df = tables[table]
+        keys = df[cols]
+        if name=='answer_list':
+            keys = keys[str_column(keys['answer_list']).str.strip()!='']
+        ref = tables[ref_table][ref_cols] if ref_table in tables else pd.DataFrame(columns=ref_cols)
+        missing = _anti_join(keys, ref)
+        issues.append(_reference_issues(
+            name, df.loc[missing], cols, f"Key not found in {ref_table}.csv."
+        ))
+
+    # Filters
+    if 'questions' in tables:
+        issues.append(_check_filters(tables['questions']))
+
+    issues = [i for i in issues if len(i) > 0]
+    if len(issues)==0:
+        return pd.DataFrame(columns=REFERENCE_REPORT_COLUMNS)
+    return pd.concat(issues, ignore_index=True)
+
+
+def check_repository_references(root, n_jobs=1, filters=True):
+    """Loads the key columns of a metadata repository and checks its referential integrity.
+    See load_key_columns() and check_references().
+
+    Returns:
+        DataFrame: Report of check_references().
+    """
+    return check_references(load_key_columns(root, n_jobs=n_jobs, filters=filters))
+
+
+def _read_columns(args):
+    csvfile, columns = args
+    return pd.read_csv(
+        csvfile,
+        encoding="utf-8",
+        header=0,
+        dtype=str,
+        keep_default_na=False,
+        usecols=lambda col: col in columns,
+    )
+
+
+def _hash_rows(df):
+    """Hashes the rows of a DataFrame of strings."""
+    if len(df.columns)==0:
+        return pd.Series([], dtype='uint64').to_numpy()
+    return pd.util.hash_pandas_object(
+        df.astype(object).fillna('').astype(str), index=False
+    ).to_numpy()
+
+
+def _anti_join(left, right):
+    """Returns the index of rows of 'left' whose values do not appear in 'right'."""
+    import numpy as np
+    missing = ~np.isin(_hash_rows(left), _hash_rows(right))
+    return left.index[missing]
+
+
+def _reference_issues(check, rows, columns, message):
+    if len(rows)==0:
+        return pd.DataFrame(columns=REFERENCE_REPORT_COLUMNS)
+    return pd.DataFrame({
+        'check': check,
+        'source': rows['source'].to_numpy() if 'source' in rows.columns else '',
+        'row': rows['row'].to_numpy() if 'row' in rows.columns else rows.index.to_numpy(),
+        'key': [';'.join(map(str, key)) for key in rows[columns].itertuples(index=False, name=None)],
+        'message': message,
+    })
+
+
+def _check_filters(questions):
+    """Checks that the items in filters of questions exist in the questionnaire."""
+    from .parser import Parser
+
+    if 'filter_parsed' in questions.columns:
+        parsed = questions['filter_parsed']
+    elif 'filter' in questions.columns:
+        filters = str_column(questions['filter'])
+        distinct = [{'filter': f} for f in filters.unique() if f.strip()!='']
+        Parser(input_type='list').parse(distinct)
+        mapping = {d['filter']: d['filter_parsed'] for d in distinct}
+        parsed = filters.map(lambda f: mapping.get(f))
+    else:
+        return pd.DataFrame(columns=REFERENCE_REPORT_COLUMNS)
+
+    # One row per referenced item
+    positions, questions_ref, items_ref = [], [], []
+    for position, f in enumerate(parsed):
+        if (f is None) or not hasattr(f, 'flat_topo'):
+            continue
+        for component in f.flat_topo:
+            positions.append(position)
+            questions_ref.append(component.question)
+            items_ref.append(component.item)
+    if len(positions)==0:
+        return pd.DataFrame(columns=REFERENCE_REPORT_COLUMNS)
+
+    rows = questions.iloc[positions]
+    if 'row' not in rows.columns:
+        rows = rows.assign(row=rows.index)
+    rows = rows.reset_index(drop=True)
+    references = pd.DataFrame({
+        'study': rows['study'].to_numpy(),
+        'questionnaire': rows['questionnaire'].to_numpy(),
+        'question': questions_ref,
+        'item': items_ref,
+    })
+    missing = _anti_join(references, questions[['study', 'questionnaire', 'question', 'item']])
+    rows = rows.loc[missing].assign(
+        filter_question=references.loc[missing, 'question'],
+        filter_item=references.loc[missing, 'item'],
+    )
+    columns = ['questionnaire', 'filter_question', 'filter_item']
+    return _reference_issues('filter_item', rows, columns, "Filter item not found in questionnaire.")
@@ -1,3 +1,5 @@
+import os
+from pathlib import Path
 from .const import CSV_TYPE_TO_COLS
 
 def write_csv(
@@ -5,10 +7,16 @@ def write_csv(
         csvfile=None, 
         csvtype=None, 
         sort_columns=False, 
-        drop_filter_parsed=True
+        drop_filter_parsed=True,
+        chunksize=None,
     ):
     """Writes a DataFrame containing SOEP-style metadata to a CSV file. 
 
+    The file is only written if its content changes. The content is written to a
+    temporary file in the same directory, which then replaces the CSV file, so that
+    the CSV file is never left partially written. The DataFrame is neither modified
+    nor copied.
+
     Args:
         dataframe (DataFrame): A pandas DataFrame containing SOEP-style metadata.
         csvfile (Path or str, optional): CSV file to be written. Defaults to None.
@@ -16,11 +24,17 @@ def write_csv(
         Required for sort_columns. Defaults to None.
         sort_columns (bool, optional): If True, columns are sorted in accordance
         with SOEP metadata standards. Defaults to False.
-        drop_filter_parsed (bool, optional): If True, column 'filter_parsed' is dropped
-        before writing. Defaults to True.
+        drop_filter_parsed (bool, optional): If True, column 'filter_parsed' is not
+        written. Defaults to True.
+        chunksize (int, optional): Number of rows written at once. Defaults to None,
+        the default of DataFrame.to_csv().
+
+    Returns:
+        bool: True if the file was written, False if the file was unchanged.
     """    
 
     # Sort columns according to SOEP standards
+    columns = list(dataframe.columns)
     if sort_columns==True:
         exception_msg = (
             "Provide argument 'csvtype' so that columns can be sorted according "
@@ -35,12 +49,77 @@ def write_csv(
                 raise Exception(exception_msg)
 
         sorted_columns = CSV_TYPE_TO_COLS[csvtype]
-        add_cols = [col for col in dataframe.columns if col not in sorted_columns]
-        dataframe = dataframe[sorted_columns + add_cols]
+        add_cols = [col for col in columns if col not in sorted_columns]
+        columns = sorted_columns + add_cols
 
-    # Drop column 'filter_parsed', which is not the SOEP standard.
-    if (drop_filter_parsed==True) & ('filter_parsed' in dataframe.columns):
-        dataframe.drop(columns=['filter_parsed'], inplace=True) 
+    # Skip column 'filter_parsed', which is not the SOEP standard.
+    if drop_filter_parsed==True:
+        columns = [col for col in columns if col!='filter_parsed']
 
     # Write dataframe, the index column is not the SOEP standard.
-    dataframe.to_csv(csvfile, index=False)
+    def write(f):
+        dataframe.to_csv(f, columns=columns, index=False, chunksize=chunksize)
+
+    if (csvfile is None) or hasattr(csvfile, 'write'):
+        write(csvfile)
+        return True
+
+    return _write_if_changed(write, csvfile)
+
+
+def write_many(dataframes, n_jobs=4, **kwargs):
+    """Writes many DataFrames to CSV files with write_csv() in a pool of threads.
+
+    Args:
+        dataframes (dict): Dictionary of form {csvfile: DataFrame}.
+        n_jobs (int, optional): Number of threads. Defaults to 4.
+        **kwargs: Arguments of write_csv(), ex.: sort_columns=True.
+
+    Returns:
+        dict: Dictionary of form {csvfile: bool}, True if the file was written and
+        False if the file was unchanged.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = {
+            csvfile: executor.submit(write_csv, dataframe, csvfile, **kwargs)
+            for csvfile, dataframe in dataframes.items()
+        }
+        return {csvfile: future.result() for csvfile, future in futures.items()}
+
+
+def _write_if_changed(write, csvfile):
+    """Writes a file with function 'write' unless the file has identical content. The
+    content is written to a temporary file, which replaces the file if content differs.
+
+    Args:
+        write (function): Function that writes content to an open text file.
+        csvfile (Path or str): File to be written.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    import uuid
+    from .utils import file_fingerprint
+
+    csvfile = Path(csvfile)
+    tmpfile = csvfile.parent / f".{csvfile.name}.{uuid.uuid4().hex}.tmp"
+    # Mode 0o666 lets the operating system apply the umask to the new file.
+    fd = os.open(tmpfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            write(f)
+
+        if csvfile.exists():
+            if (os.path.getsize(tmpfile)==csvfile.stat().st_size) and (file_fingerprint(tmpfile)==file_fingerprint(csvfile)):
+                os.remove(tmpfile)
+                return False
+            os.chmod(tmpfile, csvfile.stat().st_mode & 0o777)
+
+        os.replace(tmpfile, csvfile)
+    except BaseException:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+    return True
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+
+##########################################
+# Test data of merge and lineage
+##########################################
+
+@pytest.fixture
+def questions():
+    return pd.DataFrame(
+        [
+            ('soep-core', 'q2022', '1', 'elb0001'),
+            ('soep-core', 'q2022', '1', 'elb0002'),
+            ('soep-core', 'q2022', '2', 'elb0003'),
+        ],
+        columns=['study', 'questionnaire', 'question', 'item'],
+    )
+
+
+@pytest.fixture
+def logicals():
+    return pd.DataFrame(
+        [
+            ('soep-core', 'q2022', '1', 'elb0001', 'selfempl', 'elb0001'),
+            ('soep-core', 'q2022', '1', 'elb0002', 'selfempl', 'elb0002'),
+        ],
+        columns=['study', 'questionnaire', 'question', 'item', 'dataset', 'variable'],
+    )
+
+
+@pytest.fixture
+def generations():
+    return pd.DataFrame(
+        [
+            # Chain of four generations: selfempl/elb0001 -> pl/plb0001 -> ... -> pgen/pgb0001
+            ('soep-core', 'v38', 'selfempl', 'elb0001', 'plb0001', 'pl', 'v39', 'soep-core'),
+            ('soep-core', 'v39', 'pl', 'plb0001', 'plb0001_h', 'pl', 'v39', 'soep-core'),
+            ('soep-core', 'v39', 'pl', 'plb0001_h', 'plb0001', 'pl', 'v40', 'soep-core'),
+            ('soep-core', 'v40', 'pl', 'plb0001', 'pgb0001', 'pgen', 'v40', 'soep-core'),
+            # Cycle: selfempl/elb0002 -> a/x -> a/y -> a/x
+            ('soep-core', 'v39', 'selfempl', 'elb0002', 'x', 'a', 'v39', 'soep-core'),
+            ('soep-core', 'v39', 'a', 'x', 'y', 'a', 'v39', 'soep-core'),
+            ('soep-core', 'v39', 'a', 'y', 'x', 'a', 'v39', 'soep-core'),
+        ],
+        columns=[
+            'input_study', 'input_version', 'input_dataset', 'input_variable',
+            'output_variable', 'output_dataset', 'output_version', 'output_study',
+        ],
+    )
@@ -0,0 +1,65 @@
+import shutil
+import pandas as pd
+import pytest
+import soepdoku as soep
+from soepdoku.database import MetadataDatabase
+
+ROOT = "./tests/SOEPmetadata"
+
+
+##########################################
+# Test MetadataDatabase
+##########################################
+
+def test_database_queries():
+    with MetadataDatabase() as db:
+        assert db.load(ROOT)['added'] == 4
+
+        variables = soep.read_csv(ROOT + "/datasets/selfempl2022-simple/v39/variables.csv")
+        variable = variables.at[0, 'variable']
+        result = db.variable_versions(variable)
+        assert result[['dataset', 'version', 'variable']].values.tolist() == [
+            variables.loc[0, ['dataset', 'version', 'variable']].tolist()
+        ]
+
+        result = db.answer_list_categories('soep-core-2022-selfempl-simple', '11360M9102')
+        assert set(result['item']) == {'elb0301_v2'}
+        assert result['value'].tolist()[:2] == ['1', '2']
+
+        categories = soep.read_csv(ROOT + "/datasets/selfempl2022-simple/v39/variable_categories.csv")
+        dataset, variable, version = categories.loc[0, ['dataset', 'variable', 'version']]
+        result = db.variable_categories(dataset, variable, version)
+        expected = categories[categories['variable']==variable]
+        assert result['value'].tolist() == expected['value'].tolist()
+
+
+def test_database_incremental(tmp_path):
+    root = tmp_path / 'metadata'
+    shutil.copytree(ROOT, root)
+    csvfile = root / 'datasets/selfempl2022-simple/v39/variables.csv'
+
+    db = MetadataDatabase(tmp_path / 'metadata.sqlite')
+    assert db.load(root) == {'added': 4, 'updated': 0, 'unchanged': 0, 'removed': 0}
+    db.close()
+
+    # Reopened database only reads changed files
+    db = MetadataDatabase(tmp_path / 'metadata.sqlite')
+    variables = soep.read_csv(csvfile)
+    n = len(db.query("SELECT * FROM variables"))
+    soep.write_csv(variables.iloc[1:], csvfile)
+    assert db.load(root) == {'added': 0, 'updated': 1, 'unchanged': 3, 'removed': 0}
+    assert len(db.query("SELECT * FROM variables")) == n - 1
+
+    csvfile.unlink()
+    assert db.load(root)['removed'] == 1
+    assert len(db.query("SELECT * FROM variables")) == 0
+    db.close()
+
+
+def test_database_invalid_csvtype(tmp_path):
+    csvfile = tmp_path / 'codebook.csv'
+    pd.DataFrame({'study': ['s'], 'dataset': ['d'], 'version': ['v1'], 'variable': ['x']}).to_csv(csvfile, index=False)
+    with MetadataDatabase() as db:
+        with pytest.raises(ValueError):
+            db.load([csvfile])
+        assert len(db.query("SELECT * FROM files")) == 0
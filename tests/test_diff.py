@@ -0,0 +1,53 @@
+import shutil
+import pandas as pd
+import soepdoku as soep
+from soepdoku.diff import diff_tables, diff_release
+
+ROOT = "./tests/SOEPmetadata"
+
+
+##########################################
+# Test diff
+##########################################
+
+def test_diff_tables():
+    old = pd.DataFrame(
+        [('pl', 'x1', 'v39', 'Alter', 'age'), ('pl', 'x2', 'v39', 'Sex', 'sex'), ('pl', 'x3', 'v39', 'a', 'b')],
+        columns=['dataset', 'variable', 'version', 'label_de', 'label'],
+    )
+    new = pd.DataFrame(
+        [('pl', 'x1', 'v40', 'Alter', 'age'), ('pl', 'x2', 'v40', 'Geschlecht', 'gender'), ('pl', 'x4', 'v40', 'a', 'b')],
+        columns=['dataset', 'variable', 'version', 'label_de', 'label'],
+    )
+    result = diff_tables(old, new, keys=['dataset', 'variable'])
+    assert result.values.tolist() == [
+        ['pl', 'x2', 'changed', 'label_de,label'],
+        ['pl', 'x3', 'removed', ''],
+        ['pl', 'x4', 'added', ''],
+    ]
+
+    # Columns that exist in one version only
+    result = diff_tables(old, new.assign(concept='c'), keys=['dataset', 'variable'])
+    assert result.loc[result['variable']=='x1', 'fields'].tolist() == ['concept']
+
+
+def test_diff_release(tmp_path):
+    root = tmp_path / 'metadata'
+    shutil.copytree(ROOT, root)
+    old_dir = root / 'datasets/selfempl2022-simple/v39'
+    new_dir = root / 'datasets/selfempl2022-simple/v40'
+    shutil.copytree(old_dir, new_dir)
+
+    assert len(diff_release(root, 'v39', 'v40')) == 0
+
+    variables = soep.read_csv(new_dir / 'variables.csv')
+    variables.loc[0, 'label'] = 'changed'
+    variables['version'] = 'v40'
+    soep.write_csv(variables.iloc[:-1], new_dir / 'variables.csv')
+
+    result = diff_release(root, 'v39', 'v40', n_jobs=2)
+    old_variables = soep.read_csv(old_dir / 'variables.csv')
+    assert result[['table', 'variable', 'change', 'fields']].values.tolist() == sorted([
+        ['variables', old_variables.at[0, 'variable'], 'changed', 'label'],
+        ['variables', old_variables['variable'].iloc[-1], 'removed', ''],
+    ], key=lambda r: r[1])
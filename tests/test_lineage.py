@@ -0,0 +1,47 @@
+from soepdoku.lineage import LineageIndex
+
+
+##########################################
+# Test LineageIndex
+##########################################
+
+def write_inputs(path, logicals, generations):
+    logicals_csv = path / 'logical_variables.csv'
+    generations_csv = path / 'generations.csv'
+    logicals.to_csv(logicals_csv, index=False)
+    generations.to_csv(generations_csv, index=False)
+    return logicals_csv, generations_csv
+
+
+def test_lineage_index_lookups(logicals, generations):
+    index = LineageIndex.from_dataframes(logicals, generations)
+    assert set(index.outputs('soep-core', 'q2022', '1', 'elb0001')) == {
+        ('selfempl', 'elb0001', 'v0'),
+        ('pl', 'plb0001', 'v39'),
+        ('pl', 'plb0001_h', 'v39'),
+        ('pl', 'plb0001', 'v40'),
+        ('pgen', 'pgb0001', 'v40'),
+    }
+    assert index.outputs('soep-core', 'q2022', '2', 'elb0003') == []
+    assert index.sources('pgen', 'pgb0001', 'v40') == [('soep-core', 'q2022', '1', 'elb0001')]
+    assert index.sources('pl', 'plb0001') == [('soep-core', 'q2022', '1', 'elb0001')]
+    assert index.sources('pl', 'plb0001', 'v38') == []
+
+
+def test_lineage_index_rebuild(tmp_path, logicals, generations):
+    logicals_csv, generations_csv = write_inputs(tmp_path, logicals, generations)
+    index_file = tmp_path / 'lineage.pickle'
+
+    index = LineageIndex.from_csv(logicals_csv, generations_csv, index_file=index_file)
+    assert index_file.exists()
+    assert len(index) == 2
+
+    # Unchanged input: index is loaded
+    loaded = LineageIndex.from_csv(logicals_csv, generations_csv, index_file=index_file)
+    assert loaded.forward == index.forward
+
+    # Changed input: index is rebuilt
+    logicals.iloc[:1].to_csv(logicals_csv, index=False)
+    rebuilt = LineageIndex.from_csv(logicals_csv, generations_csv, index_file=index_file)
+    assert len(rebuilt) == 1
+    assert rebuilt.fingerprints != index.fingerprints
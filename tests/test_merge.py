@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+import pytest
+from soepdoku.merge import (
+    merge_quest_log_gen,
+    merge_quest_log_gen_batch,
+    GenerationsGraph,
+    KeyEncoder,
+    concat_str_cols,
+    join_str_groups,
+)
+
+
+##########################################
+# Helpers
+##########################################
+
+def output_sets(data):
+    return [set(o.split(',')) - {''} for o in data['output']]
+
+
+##########################################
+# Test merge_quest_log_gen
+##########################################
+
+def test_merge_quest_log_gen(questions, logicals, generations):
+    result = merge_quest_log_gen(questions, logicals, generations)
+    assert output_sets(result) == [
+        {'v0/selfempl/elb0001', 'v39/pl/plb0001', 'v39/pl/plb0001_h', 'v40/pl/plb0001', 'v40/pgen/pgb0001'},
+        {'v0/selfempl/elb0002', 'v39/a/x', 'v39/a/y'},
+        {'v0'},
+    ]
+
+
+@pytest.mark.parametrize('kwargs, expected_result', [
+    (
+        {'filter_dataset': ['pgen']},
+        [{'v40/pgen/pgb0001'}, set(), set()],
+    ),
+    (
+        {'filter_version': ['v40'], 'show_version': False},
+        [{'selfempl/elb0001', 'pl/plb0001', 'pgen/pgb0001'}, {'selfempl/elb0002'}, set()],
+    ),
+    (
+        {'show_dataset': False, 'show_version': False},
+        [{'elb0001', 'plb0001', 'plb0001_h', 'pgb0001'}, {'elb0002', 'x', 'y'}, set()],
+    ),
+])
+def test_merge_quest_log_gen_options(kwargs, expected_result, questions, logicals, generations):
+    result = merge_quest_log_gen(questions, logicals, generations, **kwargs)
+    assert output_sets(result) == expected_result
+
+
+def test_merge_quest_log_gen_no_mutation(questions, logicals, generations):
+    filter_version = ['v40']
+    merge_quest_log_gen(questions, logicals, generations, filter_version=filter_version)
+    assert list(questions.columns) == ['study', 'questionnaire', 'question', 'item']
+    assert filter_version == ['v40']
+
+
+def test_merge_quest_log_gen_batch(questions, logicals, generations):
+    questions2 = questions.iloc[[1]].assign(questionnaire='q2023')
+    logicals = pd.concat(
+        [logicals, logicals.iloc[[1]].assign(questionnaire='q2023')],
+        ignore_index=True,
+    )
+    single = merge_quest_log_gen(questions, logicals, generations)
+
+    # Dictionary of questionnaires
+    result = merge_quest_log_gen_batch(
+        {'q2022': questions, 'q2023': questions2}, logicals, generations
+    )
+    assert list(result.keys()) == ['q2022', 'q2023']
+    assert result['q2022'].equals(single)
+    assert list(result['q2023'].index) == [1]
+    assert output_sets(result['q2023']) == [{'v0/selfempl/elb0002', 'v39/a/x', 'v39/a/y'}]
+
+    # Concatenated questionnaires
+    result = merge_quest_log_gen_batch(
+        pd.concat([questions, questions2], ignore_index=True), logicals, generations
+    )
+    assert output_sets(result) == output_sets(single) + output_sets(single.iloc[[1]])
+
+
+##########################################
+# Test GenerationsGraph
+##########################################
+
+def test_generations_graph_cycles(generations):
+    graph = GenerationsGraph(generations)
+    cycles = graph.find_cycles()
+    assert set(cycles['output_variable']) == {'x', 'y'}
+
+
+def test_generations_graph_descendants(generations):
+    graph = GenerationsGraph(generations)
+    start = graph.encode(
+        pd.DataFrame([('v39', 'pl', 'plb0001_h')], columns=graph.keys_out)
+    )
+    groups, nodes = graph.descendants([0], start)
+    reached = graph.nodes.iloc[nodes]
+    assert set(reached['output_variable']) == {'plb0001_h', 'plb0001', 'pgb0001'}
+    assert list(groups) == [0, 0, 0]
+
+
+##########################################
+# Test KeyEncoder
+##########################################
+
+def test_key_encoder_shared_domains():
+    variables = pd.DataFrame({'dataset': ['pl', 'pgen'], 'variable': ['plb0001', 'pgb0001']})
+    generations = pd.DataFrame({'input_dataset': ['pgen', 'hl'], 'output_dataset': ['pl', 'pl']})
+    encoder = KeyEncoder().fit(variables, generations, version=['v0'])
+
+    assert list(encoder.categories['dataset']) == ['pl', 'pgen', 'hl']
+    assert list(encoder.categories['version']) == ['v0']
+    codes = encoder.encode(generations, ['input_dataset', 'output_dataset'])
+    assert codes.values.tolist() == [[1, 0], [2, 0]]
+
+    # Codes of existing categories do not change
+    encoder.fit(pd.DataFrame({'dataset': ['ppath', 'pl']}))
+    assert list(encoder.encode_values('dataset', ['pl', 'hl', 'ppath'])) == [0, 2, 3]
+
+
+def test_key_encoder_unknown_values():
+    encoder = KeyEncoder().fit(pd.DataFrame({'dataset': ['pl', None]}))
+    assert list(encoder.categories['dataset']) == ['pl']
+    codes = encoder.encode(pd.DataFrame({'dataset': ['pl', 'hl', None, np.nan]}), ['dataset'])
+    assert list(codes['dataset']) == [0, -1, -1, -1]
+    assert list(encoder.encode_values('variable', ['plb0001'])) == [-1]
+
+    decoded = encoder.decode(codes, ['dataset'])
+    assert list(decoded['dataset']) == ['pl', '', '', '']
+
+
+def test_key_encoder_combine():
+    encoder = KeyEncoder().fit(pd.DataFrame({'dataset': ['pl', 'hl', 'hl'], 'variable': ['a', 'b', 'c']}))
+    codes = encoder.encode(
+        pd.DataFrame({'dataset': ['pl', 'hl', 'hl', 'xx'], 'variable': ['a', 'a', 'c', 'a']}),
+        ['dataset', 'variable'],
+    )
+    keys = encoder.combine(codes, ['dataset', 'variable'])
+    assert len(set(keys)) == 4
+    assert keys.dtype == np.int64
+
+    # Columns of the same kinds in the same order give equal keys
+    other = encoder.encode(
+        pd.DataFrame({'output_dataset': ['hl'], 'output_variable': ['c']}),
+        ['output_dataset', 'output_variable'],
+    )
+    assert encoder.combine(other, ['output_dataset', 'output_variable'])[0] == keys[2]
+
+
+def test_key_encoder_combine_overflow():
+    encoder = KeyEncoder()
+    encoder.categories = {'dataset': pd.RangeIndex(2**32), 'variable': pd.RangeIndex(2**32)}
+    codes = pd.DataFrame({'dataset': [0], 'variable': [0]})
+    assert encoder.combine(codes, ['dataset'])[0] == 1
+    with pytest.raises(OverflowError):
+        encoder.combine(codes, ['dataset', 'variable'])
+
+
+##########################################
+# Test string assembly
+##########################################
+
+def test_concat_str_cols():
+    df = pd.DataFrame(
+        [('v39', 'pl', 'plb0001'), ('', 'pl', 'plb0001'), ('v0', None, None), ('', '', '')],
+        columns=['version', 'dataset', 'variable'],
+    )
+    result = concat_str_cols(df, ['version', 'dataset', 'variable'], sep='/')
+    assert list(result) == ['v39/pl/plb0001', 'pl/plb0001', 'v0', '']
+
+
+def test_join_str_groups():
+    df = pd.DataFrame(
+        [('b', 'x'), ('a', 'y'), ('b', 'z'), ('a', 'x')],
+        columns=['key', 'output'],
+    )
+    result = join_str_groups(df, by=['key'], column='output', sep=',')
+    assert result.values.tolist() == [['b', 'x,z'], ['a', 'y,x']]
+    assert len(join_str_groups(df.iloc[:0], by=['key'], column='output')) == 0
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+import soepdoku as soep
+from soepdoku.similarity import NGramIndex
+from soepdoku.merge import get_similar_questions
+
+QUESTIONS = "./tests/SOEPmetadata/questionnaires/soep-core-2022-selfempl-simple/questions.csv"
+
+
+##########################################
+# Test NGramIndex
+##########################################
+
+def test_ngram_index_candidates():
+    index = NGramIndex(['Wie alt sind Sie?', 'Wie hoch ist Ihr Einkommen?', 'Sind Sie verheiratet?'])
+    assert list(index.candidates('Wie hoch ist Ihr Einkommen', 1)) == [1]
+    assert list(index.candidates('Sind Sie alt?', None)) == [0, 1, 2]
+    assert index.scores('xyz').max() == 0
+
+
+##########################################
+# Test get_similar_questions
+##########################################
+
+def get_questionnaires():
+    quest1 = soep.read_csv(QUESTIONS)
+    quest2 = quest1.copy()
+    quest2['text_de'] = quest2['text_de'].str.replace('Unternehmen', 'Firma')
+    return quest1, quest2.iloc[::-1]
+
+
+def test_get_similar_questions():
+    pytest.importorskip('Levenshtein')
+    quest1, quest2 = get_questionnaires()
+    result = get_similar_questions(quest1, quest2)
+
+    assert 'index_2' not in quest1.columns
+    assert len(result) == len(quest1)
+    data = result[result['scale'].isin(['bin', 'int', 'cat', 'chr'])]
+    assert (data['text_de'].str.replace('Unternehmen', 'Firma') == data['text_de_2']).all()
+    assert (data['distance'] < 0.2).all()
+    assert result['index_2'].isna().sum() == (~quest1['scale'].isin(['bin', 'int', 'cat', 'chr'])).sum()
+
+
+def test_get_similar_questions_top_k():
+    pytest.importorskip('Levenshtein')
+    quest1, quest2 = get_questionnaires()
+    result = get_similar_questions(quest1, quest2, top_k=3, threshold=0.2, block_columns=['scale'])
+
+    matched = result.dropna(subset=['index_2'])
+    sizes = matched.groupby(['question', 'item']).size()
+    assert sizes.max() == 3  # Missing-value items match several items
+    assert sizes.min() == 1
+    ranks = matched.groupby(['question', 'item'])['rank'].agg(list)
+    assert all(r == list(range(1, len(r) + 1)) for r in ranks)
+    assert matched.groupby(['question', 'item'])['distance'].is_monotonic_increasing.all()
+    assert (matched['distance'] <= 0.2).all()
+    assert (matched['scale'] == quest2.loc[matched['index_2'], 'scale'].to_numpy()).all()
+
+
+def test_get_similar_questions_missing_text_in_non_data_row():
+    pytest.importorskip('Levenshtein')
+    quest1, quest2 = get_questionnaires()
+    quest1 = quest1.copy()
+    row = (~quest1['scale'].isin(['bin', 'int', 'cat', 'chr'])).to_numpy().nonzero()[0][0]
+    quest1.loc[quest1.index[row], ['scale', 'text_de']] = ['', np.nan]
+
+    result = get_similar_questions(quest1, quest2)
+    assert len(result) == len(quest1)
+    assert pd.isna(result['index_2'].iloc[row])
+
+
+##########################################
+# Test match_questionnaire_chain
+##########################################
+
+def test_match_questionnaire_chain(tmp_path):
+    pytest.importorskip('Levenshtein')
+    from soepdoku.similarity import match_questionnaire_chain
+
+    quest1, quest2 = get_questionnaires()
+    quest3 = quest2.iloc[2:]
+    questionnaires = {'2021': quest1, '2022': quest2, '2023': quest3}
+
+    result = match_questionnaire_chain(questionnaires, cache_dir=tmp_path)
+    assert list(result['questionnaire'].unique()) == ['2021', '2022', '2023']
+    assert len(list(tmp_path.iterdir())) == 2
+
+    # Items keep the id of their first appearance
+    chain = result[result['item']=='elb0302'].sort_values('questionnaire')
+    assert list(chain['chain_id']) == ['2021;2a;elb0302'] * 3
+    assert pd.isna(chain['distance'].iloc[0])
+
+    # Ids are unique within each questionnaire
+    assert not result.duplicated(['questionnaire', 'chain_id']).any()
+
+    # Cached matches are reused
+    cached = match_questionnaire_chain(questionnaires, cache_dir=tmp_path)
+    assert cached.equals(result)
@@ -0,0 +1,39 @@
+import pytest
+import soepdoku as soep
+
+pytest.importorskip('pyarrow')
+from soepdoku.snapshot import export_snapshot, load_snapshot
+
+ROOT = "./tests/SOEPmetadata"
+
+
+##########################################
+# Test snapshots
+##########################################
+
+def test_snapshot(tmp_path):
+    manifest = export_snapshot(ROOT, tmp_path)
+    assert set(manifest['tables']) == {'questions', 'answers', 'variables', 'variable_categories'}
+
+    tables = load_snapshot(tmp_path)
+    variables = soep.read_csv(ROOT + "/datasets/selfempl2022-simple/v39/variables.csv")
+    loaded = tables['variables']
+    assert loaded.csvtype == 'variables'
+    assert set(loaded['source']) == {'datasets/selfempl2022-simple/v39/variables.csv'}
+    assert loaded.drop(columns=['source']).values.tolist() == variables.values.tolist()
+    assert 'filter_parsed' not in tables['questions'].columns
+
+
+def test_snapshot_filters(tmp_path):
+    export_snapshot(ROOT, tmp_path)
+    questions = soep.read_csv(
+        ROOT + "/questionnaires/soep-core-2022-selfempl-simple/questions.csv", parse_filters=True
+    )
+
+    tables = load_snapshot(tmp_path, csvtypes=['questions'], parse_filters=True)
+    loaded = tables['questions']
+    assert [str(f) for f in loaded['filter_parsed']] == [str(f) for f in questions['filter_parsed']]
+
+    tables = load_snapshot(tmp_path, csvtypes=['variables', 'questions'], version='v38')
+    assert len(tables['variables']) == 0
+    assert len(tables['questions']) == len(questions)  # No column 'version'
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import soepdoku as soep
+from soepdoku.stata import stata_to_csv
+
+CONSTANT_COLUMNS = {
+    "study": "soep-core",
+    "dataset": "test",
+    "version": "v39",
+    "label": "",
+    "concept": "",
+    "type": "",
+    "description": "",
+    "description_de": "",
+    "minedition": "internal",
+    "template_id": "",
+}
+
+
+def write_dta(path):
+    df = pd.DataFrame({
+        'x1': np.array([1, 2, 1], dtype='int8'),
+        'x2': np.array([1, 2, 300], dtype='int16'),
+        'x3': [1.5, 2.0, np.nan],
+        'x4': ['a', 'bb', 'c'],
+    })
+    df.to_stata(
+        path,
+        write_index=False,
+        variable_labels={'x1': 'Geschlecht', 'x2': 'Alter'},
+        value_labels={'x1': {1: 'männlich', 2: 'weiblich'}},
+        version=118,
+    )
+
+
+##########################################
+# Test stata_to_csv
+##########################################
+
+def test_stata_to_csv(tmp_path, monkeypatch):
+    dta = tmp_path / 'test.dta'
+    write_dta(dta)
+
+    # Data types are read from the header, not from the observations
+    def read_stata(*args, **kwargs):
+        raise AssertionError("Observations must not be read.")
+    monkeypatch.setattr(pd, 'read_stata', read_stata)
+
+    stata_to_csv(str(dta), str(tmp_path), constant_columns=CONSTANT_COLUMNS)
+
+    variables = soep.read_csv(tmp_path / 'variables.csv')
+    assert list(variables['variable']) == ['x1', 'x2', 'x3', 'x4']
+    assert list(variables['type']) == ['byte', 'long', 'long', 'str']
+    assert list(variables['label_de']) == ['Geschlecht', 'Alter', '', '']
+
+    categories = soep.read_csv(tmp_path / 'variable_categories.csv')
+    assert categories[['variable', 'value', 'label_de']].values.tolist() == [
+        ['x1', '1', 'männlich'],
+        ['x1', '2', 'weiblich'],
+    ]
+
+
+##########################################
+# Test stata_to_csv_batch
+##########################################
+
+def test_stata_to_csv_batch(tmp_path):
+    from soepdoku.stata import stata_to_csv_batch
+
+    for version in ['v38', 'v39']:
+        (tmp_path / 'releases' / version).mkdir(parents=True)
+        write_dta(tmp_path / 'releases' / version / 'pl.dta')
+
+    kwargs = dict(
+        inputs=str(tmp_path / 'releases' / '*' / '*.dta'),
+        output_dir=str(tmp_path / 'datasets' / '{stem}' / '{version}'),
+        constant_columns={'study': 'soep-core', 'version': '{version}'},
+        path_pattern=r'(?P<version>v\d+)/\w+\.dta$',
+        manifest=tmp_path / 'manifest.json',
+    )
+    summary = stata_to_csv_batch(**kwargs)
+    assert list(summary['status']) == ['converted', 'converted']
+
+    variables = soep.read_csv(tmp_path / 'datasets' / 'pl' / 'v39' / 'variables.csv')
+    assert set(variables['dataset']) == {'pl'}
+    assert set(variables['version']) == {'v39'}
+
+    # Unchanged files are skipped
+    summary = stata_to_csv_batch(**kwargs)
+    assert list(summary['status']) == ['skipped', 'skipped']
+
+
+def test_header_datatypes_strings(tmp_path):
+    from pandas.io.stata import StataReader
+    from soepdoku.stata import _header_datatypes
+
+    df = pd.DataFrame({'x1': np.array([1, 2], dtype='int8'), 'x2': ['a' * 3000, 'b'], 'x3': ['ab', 'c']})
+
+    # strL
+    df.to_stata(tmp_path / 'strl.dta', write_index=False, version=117, convert_strl=['x2'])
+    with StataReader(tmp_path / 'strl.dta') as reader:
+        assert _header_datatypes(reader) == {'x1': 'int8', 'x2': 'object', 'x3': 'object'}
+
+    # Format 114 stores fixed-width strings as bytes
+    df[['x1', 'x3']].to_stata(tmp_path / 'old.dta', write_index=False, version=114)
+    with StataReader(tmp_path / 'old.dta') as reader:
+        assert _header_datatypes(reader) == {'x1': 'int8', 'x3': 'object'}
+
+def test_gen_value_labels_dataframe():
+    from soepdoku.stata import gen_value_labels_dataframe, gen_dataframe_from_dict
+
+    value_labels = {
+        'yesno': {2: 'Nein', 1: 'Ja'},
+        'yesno_copy': {1: 'Ja', 2: 'Nein'},
+        'scale': {10: 'hoch', -1: 'keine Angabe'},
+    }
+    variables = ['x1', 'x2', 'x3', 'x4']
+    label_names = ['yesno', '', 'scale', 'yesno_copy']
+    columns = ['variable', 'value', 'label_de']
+
+    result = gen_value_labels_dataframe(variables, label_names, value_labels, columns)
+
+    # Same rows as unpacking the sorted labels of every variable
+    expected = gen_dataframe_from_dict(
+        {
+            var: dict(sorted(value_labels.get(name, {}).items()))
+            for var, name in zip(variables, label_names)
+        },
+        columns_in_dict=columns,
+    )
+    assert result.values.tolist() == expected.values.tolist()
+    assert result['variable'].tolist() == ['x1', 'x1', 'x3', 'x3', 'x4', 'x4']
+
+
+##########################################
+# Test label_stata
+##########################################
+
+def test_label_stata(tmp_path, capsys):
+    from pandas.io.stata import StataReader
+    from soepdoku.stata import label_stata
+
+    dta = tmp_path / 'test.dta'
+    write_dta(dta)
+    stata_to_csv(str(dta), str(tmp_path), constant_columns=CONSTANT_COLUMNS)
+
+    variables = soep.read_csv(tmp_path / 'variables.csv')
+    variables['label'] = ['Sex', 'Age', 'Score', 'Text']
+    categories = pd.DataFrame(
+        [('x2', '1', 'one'), ('x2', '300', 'many'), ('x3', '1', 'float'), ('x4', '1', 'str')],
+        columns=['variable', 'value', 'label'],
+    )
+
+    output = tmp_path / 'labelled.dta'
+    label_stata(dta, output, variables, categories, label_var='label', chunk_size=5)
+
+    with StataReader(output) as reader:
+        assert reader.variable_labels() == {'x1': 'Sex', 'x2': 'Age', 'x3': 'Score', 'x4': 'Text'}
+        value_labels = reader.value_labels()
+        label_names = reader._lbllist
+    # x1 keeps its value labels, numeric variables are labelled, string variables are not
+    assert label_names == ['x1', 'x2', 'x3', '']
+    assert value_labels['x1'] == {1: 'männlich', 2: 'weiblich'}
+    assert value_labels['x2'] == {1: 'one', 300: 'many'}
+    assert value_labels['x3'] == {1: 'float'}
+    assert "Value labels of string variables are ignored (1 rows): ['x4']" in capsys.readouterr().out
+
+    original = pd.read_stata(dta, convert_categoricals=False)
+    labelled = pd.read_stata(output, convert_categoricals=False)
+    assert labelled.equals(original)
+
+
+def test_build_value_labels():
+    from soepdoku.stata import build_value_labels
+
+    categories = pd.DataFrame(
+        [('a', '2', 'Nein'), ('a', '1', 'Ja'), ('b', '1', 'Ja'), ('b', '2', 'Nein'), ('c', '-1', 'k.A.')],
+        columns=['variable', 'value', 'label_de'],
+    )
+    sets, var_to_set = build_value_labels(categories)
+    assert sets == {'a': {1: 'Ja', 2: 'Nein'}, 'c': {-1: 'k.A.'}}
+    assert var_to_set == {'a': 'a', 'b': 'a', 'c': 'c'}
@@ -0,0 +1,366 @@
+import sys
+import types
+import pandas as pd
+import pytest
+import soepdoku as soep
+
+
+##########################################
+# Fake translation service
+##########################################
+
+class FakeDeepl:
+    """Stand-in for deepl.Translator that upper-cases texts and records requests."""
+
+    def __init__(self, auth_key, **kwargs):
+        self.requests = []
+        self.glossaries = []
+
+    def translate_text(self, text, source_lang=None, target_lang=None, glossary=None, **kwargs):
+        self.requests.append(text)
+        translate = self.translate_xml if kwargs.get('tag_handling')=='xml' else str.upper
+        if isinstance(text, list):
+            return [translate(t) for t in text]
+        return translate(text)
+
+    def translate_xml(self, text):
+        import re
+        return re.sub(r">([^<]*)<", lambda m: ">" + m.group(1).upper() + "<", text)
+
+    def create_glossary(self, name, source_lang, target_lang, entries):
+        glossary = types.SimpleNamespace(name=name, source_lang=source_lang[:2].lower(), target_lang=target_lang[:2].lower())
+        self.glossaries.append(glossary)
+        return glossary
+
+    def list_glossaries(self):
+        return list(self.glossaries)
+
+
+@pytest.fixture
+def translator(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'deepl', types.SimpleNamespace(Translator=FakeDeepl))
+    return soep.Translator(service='deepl', auth_key='key')
+
+
+def get_categories():
+    return pd.DataFrame(
+        [
+            ('x1', '-1', 'keine Angabe', ''),
+            ('x1', '1', 'Trifft voll zu', ''),
+            ('x1', '2', 'Trifft nicht zu', 'does not apply'),
+            ('x2', '1', 'Trifft voll zu', ''),
+            ('x2', '2', ' ', ''),
+        ],
+        columns=['variable', 'value', 'label_de', 'label'],
+    )
+
+
+##########################################
+# Test translate
+##########################################
+
+def test_translate(translator):
+    df = get_categories()
+    translator.translate(df, source_target={'label_de': 'label'})
+    assert list(df['label']) == ['', 'TRIFFT VOLL ZU', 'does not apply', 'TRIFFT VOLL ZU', '']
+    # Identical texts are sent once, in a single batch
+    assert translator.translator.requests == [['Trifft voll zu']]
+
+
+def test_translate_options(translator):
+    df = get_categories()
+    translator.translate(df, source_target={'label_de': 'label'}, replace=True, missings=True)
+    assert list(df['label']) == ['KEINE ANGABE', 'TRIFFT VOLL ZU', 'TRIFFT NICHT ZU', 'TRIFFT VOLL ZU', '']
+
+
+def test_batches(translator):
+    batches = translator.batches(['aa', 'bb', 'cccc', 'd', 'e'], batch_size=2, batch_chars=4)
+    assert batches == [['aa', 'bb'], ['cccc'], ['d', 'e']]
+
+
+##########################################
+# Test TranslationMemory
+##########################################
+
+def test_translation_memory(translator, tmp_path):
+    from soepdoku.memory import TranslationMemory
+
+    path = tmp_path / 'memory.sqlite'
+    with TranslationMemory(path) as memory:
+        n = memory.seed(
+            get_categories(),
+            source_target={'label_de': 'label'},
+        )
+        assert n == 1  # Only rows with source and target text
+
+    translator.memory = TranslationMemory(path)
+    df = get_categories()
+    translator.translate(df, source_target={'label_de': 'label'}, replace=True)
+    assert list(df['label']) == ['', 'TRIFFT VOLL ZU', 'does not apply', 'TRIFFT VOLL ZU', '']
+    assert translator.translator.requests == [['Trifft voll zu']]
+    assert (translator.memory.hits, translator.memory.misses) == (1, 1)
+
+    # Second run is answered from memory
+    translator.translate(get_categories(), source_target={'label_de': 'label'}, replace=True)
+    assert len(translator.translator.requests) == 1
+    assert len(translator.memory) == 2
+
+    # Translations with a glossary are stored separately
+    translator.translate(
+        get_categories(), source_target={'label_de': 'label'}, glossary={'zu': 'to'}
+    )
+    assert translator.translator.requests[-1] == ['Trifft voll zu']
+
+
+##########################################
+# Test concurrent translation
+##########################################
+
+@pytest.fixture
+def server():
+    """Local stand-in for the translation API. Texts are upper-cased; every first request
+    of a batch fails with 429, and texts containing 'FAIL' always fail."""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    seen = set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            texts = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['text']
+            with lock:
+                first = tuple(texts) not in seen
+                seen.add(tuple(texts))
+            if first or any('FAIL' in t for t in texts):
+                self.send_response(429)
+                self.end_headers()
+                return
+            body = json.dumps({'translations': [{'text': t.upper()} for t in texts]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+class HttpDeepl(FakeDeepl):
+    """Client that sends requests to the server given by 'server_url'."""
+
+    def __init__(self, auth_key, server_url=None, **kwargs):
+        super().__init__(auth_key)
+        self.server_url = server_url
+
+    def translate_text(self, text, **kwargs):
+        import json
+        import urllib.request
+        request = urllib.request.Request(
+            self.server_url, data=json.dumps({'text': text}).encode(), method='POST'
+        )
+        with urllib.request.urlopen(request) as response:
+            return [t['text'] for t in json.loads(response.read())['translations']]
+
+
+def test_translate_concurrent(monkeypatch, server):
+    monkeypatch.setitem(sys.modules, 'deepl', types.SimpleNamespace(Translator=HttpDeepl))
+    translator = soep.Translator(service='deepl', auth_key='key', server_url=server)
+
+    df = pd.DataFrame({
+        'label_de': [f"Text {i}" for i in range(39)] + ['FAIL'],
+        'label': '',
+    })
+    failed = translator.translate(
+        df,
+        source_target={'label_de': 'label'},
+        batch_size=3,
+        n_jobs=4,
+        rate_limit=1000,
+        retries=2,
+        backoff=0.01,
+    )
+    assert list(df['label'][:39]) == [f"TEXT {i}" for i in range(39)]
+    assert df.at[39, 'label'] == ''
+    assert failed[['index', 'source', 'target', 'text']].values.tolist() == [[39, 'label_de', 'label', 'FAIL']]
+    assert 'HTTPError' in failed.at[0, 'error']
+
+
+def test_request_permanent_error(translator, monkeypatch):
+    import urllib.error
+
+    def translate_text(self, text, **kwargs):
+        self.requests.append(text)
+        raise urllib.error.HTTPError('url', 403, 'Forbidden', None, None)
+    monkeypatch.setattr(FakeDeepl, 'translate_text', translate_text)
+    translator.translate_text = translator.translator.translate_text
+
+    df = get_categories()
+    failed = translator.translate(df, source_target={'label_de': 'label'}, retries=3, backoff=10)
+    # Not retried
+    assert len(translator.translator.requests) == 1
+    assert 'HTTPError' in failed.at[0, 'error']
+
+
+def test_rate_limiter():
+    import time
+    from soepdoku.translator import RateLimiter
+
+    limiter = RateLimiter(rate=100, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+##########################################
+# Test glossaries
+##########################################
+
+def test_get_glossary(translator):
+    glossary = {'Anteil': 'share', 'Arbeitsprobe': 'work trial'}
+    for _ in range(3):
+        translator.translate(get_categories(), source_target={'label_de': 'label'}, glossary=glossary)
+    assert len(translator.translator.glossaries) == 1
+
+    # Glossaries stored by the service are reused by a new Translator
+    service = translator.translator
+    other = soep.Translator(service='deepl', auth_key='key')
+    other.translator = service
+    glos = other.get_glossary(dict(reversed(glossary.items())), 'DE', 'EN-US')
+    assert glos is service.glossaries[0]
+    assert len(service.glossaries) == 1
+
+    # Different language pair
+    other.get_glossary(glossary, 'DE', 'FR')
+    assert len(service.glossaries) == 2
+
+
+##########################################
+# Test translatable
+##########################################
+
+@pytest.mark.parametrize('replace, missings', [(False, False), (True, False), (False, True)])
+def test_translatable_mask(translator, replace, missings):
+    df = pd.DataFrame(
+        [
+            ('-1', 'keine Angabe', ''),
+            (' -2 ', 'trifft nicht zu', ''),
+            ('-0', 'null', ''),
+            ('1.5', 'Text', ''),
+            ('', 'Text', 'text'),
+            ('3', '  ', ''),
+            ('4', 'Text', ' '),
+            (-1.0, 'keine Angabe', ''),
+            ('-1.0', 'keine Angabe', ''),
+            (-1.5, 'Text', ''),
+        ],
+        columns=['value', 'label_de', 'label'],
+    )
+    mask = translator.translatable_mask(df, 'label_de', 'label', replace, missings)
+    expected = [
+        translator.translatable(df.at[i, 'label_de'], df.loc[i], 'label_de', 'label', replace, missings)
+        for i in df.index
+    ]
+    assert list(mask) == expected
+    # Float values of missings
+    assert list(mask[7:]) == [missings, missings, True]
+
+
+##########################################
+# Test context
+##########################################
+
+def test_translate_context(translator):
+    df = get_categories()
+    translator.translate(
+        df, source_target={'label_de': 'label'}, replace=True, missings=True, context='variable'
+    )
+    assert list(df['label']) == ['KEINE ANGABE', 'TRIFFT VOLL ZU', 'TRIFFT NICHT ZU', 'TRIFFT VOLL ZU', '']
+    # One text per variable
+    assert translator.translator.requests == [[
+        '<t>keine Angabe</t>\n<t>Trifft voll zu</t>\n<t>Trifft nicht zu</t>',
+        '<t>Trifft voll zu</t>',
+    ]]
+
+
+def test_translate_context_fallback(translator, monkeypatch):
+    # Translations that lose the delimiters are translated cell by cell
+    monkeypatch.setattr(FakeDeepl, 'translate_xml', lambda self, text: 'broken')
+    df = get_categories()
+    failed = translator.translate(df, source_target={'label_de': 'label'}, context='variable')
+    assert list(df['label']) == ['', 'TRIFFT VOLL ZU', 'does not apply', 'TRIFFT VOLL ZU', '']
+    assert len(failed) == 0
+    assert translator.translator.requests[-1] == ['Trifft voll zu']
+
+
+def test_translate_context_memory(translator, tmp_path):
+    from soepdoku.memory import TranslationMemory
+
+    translator.memory = TranslationMemory(tmp_path / 'memory.sqlite')
+    translator.memory.seed(get_categories(), source_target={'label_de': 'label'})
+
+    # Cells in memory are not sent, and translated segments are stored per cell
+    df = get_categories()
+    translator.translate(
+        df, source_target={'label_de': 'label'}, replace=True, missings=True, context='variable'
+    )
+    assert list(df['label']) == ['KEINE ANGABE', 'TRIFFT VOLL ZU', 'does not apply', 'TRIFFT VOLL ZU', '']
+    assert translator.translator.requests == [['<t>keine Angabe</t>\n<t>Trifft voll zu</t>', '<t>Trifft voll zu</t>']]
+    assert len(translator.memory) == 3
+
+    # Runs without context reuse the cells
+    df = get_categories()
+    translator.translate(df, source_target={'label_de': 'label'}, replace=True, missings=True)
+    assert list(df['label']) == ['KEINE ANGABE', 'TRIFFT VOLL ZU', 'does not apply', 'TRIFFT VOLL ZU', '']
+    assert len(translator.translator.requests) == 1
+
+
+def test_translate_context_missing_group(translator):
+    df = pd.DataFrame({
+        'question': ['1', '1', None],
+        'text_de': ['Wie alt sind Sie?', 'Jahre', 'Hinweis'],
+        'text': '',
+    })
+    failed = translator.translate(df, source_target={'text_de': 'text'}, context='question')
+    assert list(df['text']) == ['WIE ALT SIND SIE?', 'JAHRE', 'HINWEIS']
+    assert len(failed) == 0
+    assert translator.translator.requests[-1] == ['Hinweis']
+
+
+##########################################
+# Test FuzzyMemoryBackend
+##########################################
+
+def test_fuzzy_memory_backend():
+    pytest.importorskip('Levenshtein')
+
+    previous = pd.DataFrame({
+        'label_de': ['Trifft voll zu', 'Trifft nicht zu', 'Anteil am Umsatz in Prozent'],
+        'label': ['Fully applies', 'Does not apply', 'Share of turnover in percent'],
+    })
+    translator = soep.Translator(
+        service='memory', data=previous, source_target={'label_de': 'label'}, threshold=0.1
+    )
+
+    df = pd.DataFrame({
+        'label_de': ['Trifft voll zu', 'Anteil am Umsatz in Prozent.', 'Völlig neuer Text'],
+        'label': '',
+    })
+    failed = translator.translate(df, source_target={'label_de': 'label'})
+    assert list(df['label']) == ['Fully applies', 'Share of turnover in percent', '']
+    assert failed[['text', 'error']].values.tolist() == [['Völlig neuer Text', 'No translation found.']]
+
+
+def test_translator_invalid_service():
+    with pytest.raises(ValueError):
+        soep.Translator(service='unknown')
+    with pytest.raises(TypeError):
+        soep.TranslationBackend()
@@ -0,0 +1,95 @@
+import shutil
+import pandas as pd
+import soepdoku as soep
+from soepdoku.validation import validate_dataframe, validate_repository
+
+ROOT = "./tests/SOEPmetadata"
+
+
+##########################################
+# Test validation
+##########################################
+
+def test_validate_dataframe():
+    df = pd.DataFrame(
+        [
+            ('soep-core', 'pl', 'v39', 'x1', '1', 'one', 'eins', ''),
+            ('soep-core', 'pl', 'v39', 'x1', '1', 'one', 'eins', ''),
+            ('soep-core', 'pl', 'v39', '', '2', 'two', 'zwei', ''),
+            ('soep-core', 'pl', 'v39', 'x2', '1.5', '', '', ''),
+        ],
+        columns=['study', 'dataset', 'version', 'variable', 'value', 'label', 'label_de', 'note'],
+    )
+    report = validate_dataframe(df, csvtype='variable_categories')
+    assert report[['check', 'column', 'row']].values.tolist() == [
+        ['extra_column', 'note', -1],
+        ['empty_key', 'variable', 2],
+        ['duplicate_key', 'study,dataset,version,variable,value', 0],
+        ['duplicate_key', 'study,dataset,version,variable,value', 1],
+        ['non_numeric_value', 'value', 3],
+    ]
+    report = validate_dataframe(df.drop(columns=['label']), csvtype='variable_categories')
+    assert ['missing_column', 'label'] in report[['check', 'column']].values.tolist()
+
+
+def test_validate_repository(tmp_path):
+    assert len(validate_repository(ROOT)) == 0
+
+    shutil.copytree(ROOT, tmp_path / 'metadata')
+    csvfile = tmp_path / 'metadata/questionnaires/soep-core-2022-selfempl-simple/answers.csv'
+    answers = soep.read_csv(csvfile)
+    answers.loc[0, 'value'] = 'x'
+    soep.write_csv(answers, csvfile)
+
+    report = validate_repository(tmp_path / 'metadata', n_jobs=2)
+    assert report[['file', 'check', 'row']].values.tolist() == [
+        ['questionnaires/soep-core-2022-selfempl-simple/answers.csv', 'non_numeric_value', 0],
+    ]
+
+
+##########################################
+# Test referential integrity
+##########################################
+
+def test_check_references():
+    from soepdoku.validation import check_references, check_repository_references
+
+    assert len(check_repository_references(ROOT)) == 0
+
+    questions = pd.DataFrame(
+        [
+            ('soep-core', 'q1', '1', 'a', 'list1', ''),
+            ('soep-core', 'q1', '2', 'b', 'list2', '1;a=1 & 1;x=2'),
+            ('soep-core', 'q1', '3', 'c', '', '2;b=1'),
+        ],
+        columns=['study', 'questionnaire', 'question', 'item', 'answer_list', 'filter'],
+    )
+    answers = pd.DataFrame(
+        [('soep-core', 'q1', 'list1', '1')],
+        columns=['study', 'questionnaire', 'answer_list', 'value'],
+    )
+    variables = pd.DataFrame(
+        [('soep-core', 'pl', 'v39', 'x1')],
+        columns=['study', 'dataset', 'version', 'variable'],
+    )
+    categories = pd.DataFrame(
+        [('soep-core', 'pl', 'v39', 'x1', '1'), ('soep-core', 'pl', 'v38', 'x1', '1')],
+        columns=['study', 'dataset', 'version', 'variable', 'value'],
+    )
+    logicals = pd.DataFrame(
+        [('soep-core', 'q1', '1', 'a', 'pl', 'x1'), ('soep-core', 'q1', '2', 'b', 'pl', 'x2')],
+        columns=['study', 'questionnaire', 'question', 'item', 'dataset', 'variable'],
+    )
+    report = check_references({
+        'questions': questions,
+        'answers': answers,
+        'variables': variables,
+        'variable_categories': categories,
+        'logical_variables': logicals,
+    })
+    assert report[['check', 'row', 'key']].values.tolist() == [
+        ['answer_list', 1, 'soep-core;q1;list2'],
+        ['categories_variable', 1, 'soep-core;pl;v38;x1'],
+        ['logical_variable', 1, 'pl;x2'],
+        ['filter_item', 1, 'q1;1;x'],
+    ]
@@ -0,0 +1,79 @@
+import os
+import pandas as pd
+import soepdoku as soep
+from soepdoku.writer import write_csv, write_many
+
+FILE = "./tests/SOEPmetadata/datasets/selfempl2022-simple/v39/variables.csv"
+
+
+##########################################
+# Test write_csv
+##########################################
+
+def test_write_csv_unchanged(tmp_path):
+    data = soep.read_csv(FILE)
+    csvfile = tmp_path / 'variables.csv'
+
+    assert write_csv(data, csvfile) == True
+    mtime = os.stat(csvfile).st_mtime_ns
+
+    # Identical content is not written again
+    assert write_csv(data, csvfile) == False
+    assert os.stat(csvfile).st_mtime_ns == mtime
+
+    data.loc[0, 'label'] = 'changed'
+    assert write_csv(data, csvfile) == True
+    assert soep.read_csv(csvfile).loc[0, 'label'] == 'changed'
+
+    # No temporary files are left
+    assert [f.name for f in tmp_path.iterdir()] == ['variables.csv']
+
+
+def test_write_csv_roundtrip(tmp_path):
+    # Files read and written without changes stay identical
+    csvfile = tmp_path / 'variables.csv'
+    csvfile.write_bytes(open(FILE, 'rb').read())
+    assert write_csv(soep.read_csv(csvfile), csvfile) == False
+
+
+def test_write_many(tmp_path):
+    data = soep.read_csv(FILE)
+    files = {tmp_path / f"{k}.csv": data for k in range(5)}
+    assert write_many(files, n_jobs=2) == {f: True for f in files}
+    assert write_many(files, n_jobs=2) == {f: False for f in files}
+
+
+def test_write_csv_no_mutation(tmp_path):
+    data = soep.read_csv(
+        "./tests/SOEPmetadata/questionnaires/soep-core-2022-selfempl-simple/questions.csv",
+        parse_filters=True,
+    )
+    columns = list(data.columns)
+    csvfile = tmp_path / 'questions.csv'
+
+    write_csv(data, csvfile, sort_columns=True, chunksize=7)
+
+    # Parsed filters of the caller are kept, but not written
+    assert list(data.columns) == columns
+    assert 'filter_parsed' in data.columns
+    written = soep.read_csv(csvfile)
+    assert 'filter_parsed' not in written.columns
+    assert written.equals(data.drop(columns=['filter_parsed']).astype(str))
+
+
+def test_write_csv_permissions(tmp_path):
+    data = soep.read_csv(FILE)
+    csvfile = tmp_path / 'variables.csv'
+
+    umask = os.umask(0o022)
+    try:
+        write_csv(data, csvfile)
+    finally:
+        os.umask(umask)
+    assert csvfile.stat().st_mode & 0o777 == 0o644
+
+    # Existing permissions are kept
+    os.chmod(csvfile, 0o600)
+    data.loc[0, 'label'] = 'changed'
+    write_csv(data, csvfile)
+    assert csvfile.stat().st_mode & 0o777 == 0o600